@@ -1,10 +1,15 @@
+from contextlib import suppress
+
 import streamlit as st
 from bidding_sheet_builder import bidding_sheet_builder
 from catalog_sheet_builder import catalog_sheet_builder
 from catalog_qc import catalog_qc
+from instrumentation import collect, enable_logging
+from preview import JobPending, performance_panel
 
 
 st.set_page_config(page_title="📊 Bidding Sheet Builder", layout="wide")
+enable_logging()
 
 # Inject custom CSS for brand styling and logo
 st.markdown("""
@@ -173,10 +178,16 @@ st.markdown("""
 tabs = st.tabs(["Bidding Sheet Builder", "Catalog Sheet Builder", "Catalog QC"])
 
 with tabs[0]:
-    bidding_sheet_builder()
+    with collect("bidding") as records, suppress(JobPending):
+        bidding_sheet_builder()
+    performance_panel(records)
 
 with tabs[1]:
-    catalog_sheet_builder()
+    with collect("catalog") as records, suppress(JobPending):
+        catalog_sheet_builder()
+    performance_panel(records)
 
 with tabs[2]:
-    catalog_qc()
\ No newline at end of file
+    with collect("qc") as records, suppress(JobPending):
+        catalog_qc()
+    performance_panel(records)
@@ -0,0 +1,186 @@
+"""Stage-by-stage benchmark of the bidding -> catalog -> QC pipeline on synthetic data.
+
+    python benchmark.py                       # small and medium datasets
+    python benchmark.py --datasets large      # one dataset
+    python benchmark.py --update-baselines    # store the results as the new baselines
+
+Each stage is timed (best of --repeat runs) and its peak traced Python/NumPy allocation is
+recorded. Stages slower than their stored baseline by more than --threshold are flagged and
+the exit code is 1.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from bidding_core import add_ranking, aggregate_bids, apply_markup, build_product_key, to_wide
+from catalog_core import build_catalog_sheet
+from excel_export import bidding_sheet_xlsx, partner_quotes_csv_bytes
+from ingestion import concat_frames, load_supplier_files
+from partitioned import aggregate_sharded
+from qc_core import compare_catalogs
+from storage import data_path
+from synthetic_data import generate_supplier_sheets
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+
+DATASETS = {
+    'small': dict(n_skus=500, n_partners=5),
+    'medium': dict(n_skus=5000, n_partners=20),
+    'large': dict(n_skus=20000, n_partners=80),
+}
+
+BASELINES_FILE = 'benchmark_baselines.json'
+
+# Timings below this are too noisy to call a regression
+MIN_REGRESSION_SECONDS = 0.02
+
+PREVIEW_ROWS = 100
+
+
+class _Upload(io.BytesIO):
+    # Stands in for a Streamlit upload: bytes plus a file name
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def _style_preview(bidding_df):
+    # Imported here so the other stages can be measured without streamlit installed
+    from bidding_sheet_builder import style_dataframe
+    from preview import price_match_mask
+
+    page = to_wide(bidding_df.iloc[:PREVIEW_ROWS])
+    return style_dataframe(page, price_match_mask(page, 'Bid Selected Price')).to_html()
+
+
+def _stages(uploads):
+    """Stage name -> (function, name of the stage whose output it takes)."""
+    def ingest(_):
+        frames, errors = load_supplier_files(uploads)
+        if errors:
+            raise ValueError(f'Synthetic sheets failed to load: {errors}')
+        return concat_frames([df for _, df in frames])
+
+    def build_keys(combined_df):
+        return combined_df.assign(**{'Product Key': build_product_key(combined_df)})
+
+    def qc_join(catalog_df):
+        price_col = next(col for col in catalog_df.columns if 'Customer Price' in col)
+        candidate = catalog_df.copy()
+        candidate[price_col] = candidate[price_col] + np.where(np.arange(len(candidate)) % 50 == 0, 1, 0)
+        return compare_catalogs(catalog_df, candidate, 'Dandpo SKU', 'Quantity', price_col,
+                                'Dandpo SKU', 'Quantity', price_col, duplicates='first')[0]
+
+    return {
+        'ingestion': (ingest, None),
+        'key_building': (build_keys, 'ingestion'),
+        'aggregation': (lambda combined_df: aggregate_bids(combined_df, sparse=True), 'key_building'),
+        # Key building and aggregation over PRICINGAI_AGGREGATION_WORKERS processes, at any size
+        'sharded_keys_agg': (lambda combined_df: aggregate_sharded(combined_df, min_rows=0), 'ingestion'),
+        'ranking': (add_ranking, 'aggregation'),
+        'markup': (lambda bids_df: apply_markup(bids_df, 35.0), 'ranking'),
+        'catalog_transform': (build_catalog_sheet, 'markup'),
+        'qc_join': (qc_join, 'catalog_transform'),
+        'excel_export': (bidding_sheet_xlsx, 'markup'),
+        'long_export': (partner_quotes_csv_bytes, 'markup'),
+        'styling': (_style_preview, 'markup'),
+    }
+
+
+def run_dataset(name: str, repeat: int = 3) -> dict[str, dict[str, float]]:
+    params = DATASETS[name]
+    sheets = generate_supplier_sheets(seed=0, **params)
+    uploads = [_Upload(sheet.to_csv(index=False).encode('utf-8'), file_name) for file_name, sheet in sheets]
+
+    results, outputs = {}, {}
+    for stage, (func, source) in _stages(uploads).items():
+        arg = outputs.get(source)
+        seconds = []
+        for _ in range(repeat):
+            for upload in uploads:
+                upload.seek(0)
+            start = time.perf_counter()
+            outputs[stage] = func(arg)
+            seconds.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        func(arg)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[stage] = {'seconds': round(min(seconds), 4), 'peak_mb': round(peak / 2**20, 1)}
+
+    results['_rows'] = {'supplier_rows': sum(len(sheet) for _, sheet in sheets),
+                        'bidding_rows': len(outputs['aggregation'])}
+    return results
+
+
+def find_regressions(results: dict, baselines: dict, threshold: float) -> list[str]:
+    regressions = []
+    for dataset, stages in results.items():
+        for stage, current in stages.items():
+            baseline = baselines.get(dataset, {}).get(stage)
+            if stage.startswith('_') or not baseline:
+                continue
+            slower = current['seconds'] - baseline['seconds']
+            if slower > MIN_REGRESSION_SECONDS and current['seconds'] > baseline['seconds'] * (1 + threshold):
+                regressions.append(f"{dataset}/{stage}: {current['seconds']:.3f}s vs {baseline['seconds']:.3f}s baseline")
+            if current['peak_mb'] > baseline['peak_mb'] * (1 + threshold) + 1:
+                regressions.append(f"{dataset}/{stage}: {current['peak_mb']:.1f} MB vs {baseline['peak_mb']:.1f} MB baseline")
+    return regressions
+
+
+def print_results(results: dict, baselines: dict):
+    for dataset, stages in results.items():
+        rows = stages['_rows']
+        print(f"\n{dataset}: {rows['supplier_rows']:,} supplier rows -> {rows['bidding_rows']:,} bidding rows")
+        print(f"  {'stage':<18} {'seconds':>9} {'baseline':>9} {'peak MB':>9}")
+        for stage, current in stages.items():
+            if stage.startswith('_'):
+                continue
+            baseline = baselines.get(dataset, {}).get(stage, {}).get('seconds')
+            baseline = f'{baseline:.3f}' if baseline is not None else '-'
+            print(f"  {stage:<18} {current['seconds']:>9.3f} {baseline:>9} {current['peak_mb']:>9.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark each pipeline stage on synthetic supplier sheets.')
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASETS), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage; the fastest counts')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown before flagging (0.25 = 25%%)')
+    parser.add_argument('--baselines', default=None, help=f'Baselines file (default: {BASELINES_FILE} in the data dir)')
+    parser.add_argument('--update-baselines', action='store_true', help='Store these results as the baselines')
+    args = parser.parse_args(argv)
+
+    path = args.baselines or data_path(BASELINES_FILE)
+    baselines = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            baselines = json.load(f)
+
+    results = {dataset: run_dataset(dataset, args.repeat) for dataset in args.datasets}
+    print_results(results, baselines)
+
+    if args.update_baselines:
+        with open(path, 'w') as f:
+            json.dump({**baselines, **results}, f, indent=2)
+        print(f'\nbaselines written to {path}')
+        return EXIT_OK
+
+    regressions = find_regressions(results, baselines, args.threshold)
+    if regressions:
+        print('\nregressions:')
+        for line in regressions:
+            print(f'  {line}')
+        return EXIT_REGRESSION
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
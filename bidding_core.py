@@ -0,0 +1,299 @@
+import numpy as np
+import pandas as pd
+
+# Required columns for bidding sheet
+REQUIRED_COLUMNS = [
+    'Category',
+    'Dandpo SKU',
+    'Combinations',
+    'Printer Specifications',
+    'Quantity',
+    'Sample',
+    'Printer Cost',
+    'Lead Time',
+    'Weight in kg',
+    'Partner Name'
+]
+
+KEY_COLUMNS = [
+    'Category',
+    'Dandpo SKU',
+    'Combinations',
+    'Printer Specifications',
+    'Quantity',
+    'Sample',
+    'Lead Time',
+    'Weight in kg'
+]
+
+PRICE_COLUMN = 'Printer Cost'
+PARTNER_COLUMN = 'Partner Name'
+PRODUCT_KEY_COLUMN = 'Product Key'
+
+# DataFrame.attrs carried by bidding tables and stored in their Parquet metadata
+PARTNER_COLUMNS_ATTR = 'partner_columns'
+MARKUP_ATTR = 'markup_percentage'
+
+# Ranks reported after the winners: the 2nd and 3rd best partners
+RANK_DEPTH = 3
+# Rows densified at a time when ranking or exporting a sparse partner matrix
+CHUNK_ROWS = 20_000
+# A partner column is stored sparse below this share of quoted keys; above it the index of a
+# sparse column costs more than the NaNs it saves
+SPARSE_MAX_DENSITY = 0.5
+
+
+def validate_header(columns, filename):
+    missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"File {filename} is missing columns: {', '.join(missing)}")
+    return columns
+
+
+def build_product_key(df: pd.DataFrame) -> pd.Series:
+    """Integer group id per distinct combination of KEY_COLUMNS, numbered in sorted key order."""
+    keys = df[KEY_COLUMNS]
+    # Groups sort by category code; with the categories in value order the ids do not depend
+    # on which files, in which order, made up the categories
+    unsorted = {
+        col: keys[col].cat.reorder_categories(dtype.categories.sort_values())
+        for col, dtype in keys.dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype) and not dtype.categories.is_monotonic_increasing
+    }
+    if unsorted:
+        keys = keys.assign(**unsorted)
+    ids = keys.groupby(KEY_COLUMNS, sort=True, observed=True, dropna=False).ngroup()
+    return ids.astype('int32') if len(ids) < 2**31 else ids
+
+
+def key_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Stable signed 64-bit hash of each row's KEY_COLUMNS values, independent of categories."""
+    hashes = pd.util.hash_pandas_object(df[KEY_COLUMNS], index=False, categorize=True)
+    return hashes.to_numpy().view(np.int64)
+
+
+def _restore_int_columns(frame: pd.DataFrame, dtype) -> pd.DataFrame:
+    # unstack/reindex upcast everything to float; columns without gaps keep the source dtype
+    if pd.api.types.is_integer_dtype(dtype):
+        complete = frame.columns[frame.notna().all()]
+        if len(complete):
+            frame[complete] = frame[complete].astype(dtype)
+    return frame
+
+
+def _join_by_key(keys: pd.Index, names: pd.Index) -> pd.Series:
+    # ', '-join names per key in their given order, one vectorized pass per tie rank
+    names = pd.Series(names.astype(str), index=keys)
+    rank = names.groupby(level=0, sort=False).cumcount().to_numpy()
+    joined = names[rank == 0]
+    for r in range(1, rank.max() + 1 if len(rank) else 1):
+        extra = names[rank == r]
+        joined.loc[extra.index] = joined.loc[extra.index] + ', ' + extra
+    return joined
+
+
+def partner_columns(bidding_df: pd.DataFrame) -> list[str]:
+    return [col for col in bidding_df.attrs.get(PARTNER_COLUMNS_ATTR, []) if col in bidding_df.columns]
+
+
+def _compact(column: np.ndarray):
+    if np.count_nonzero(~np.isnan(column)) < SPARSE_MAX_DENSITY * len(column):
+        return pd.arrays.SparseArray(column, fill_value=np.nan)
+    return column
+
+
+def compact_partners(bidding_df: pd.DataFrame) -> pd.DataFrame:
+    """Store each partner column sparse or dense, whichever its share of quotes makes smaller."""
+    partners = partner_columns(bidding_df)
+    if not partners:
+        return bidding_df
+    compacted = bidding_df.copy()
+    for partner in partners:
+        compacted[partner] = _compact(bidding_df[partner].to_numpy(dtype=float, na_value=np.nan))
+    return compacted
+
+
+def _sparse_matrix(quotes: pd.Series, keys: pd.Index, partners: list) -> pd.DataFrame:
+    # Columns are filled straight from the quotes, one at a time, so the dense keys x partners
+    # matrix never exists
+    rows = keys.get_indexer(quotes.index.get_level_values(0))
+    codes = pd.Index(partners).get_indexer(quotes.index.get_level_values(1))
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(partners) + 1))
+    prices = quotes.to_numpy(dtype=float)
+    columns = {}
+    for i, partner in enumerate(partners):
+        part = order[bounds[i]:bounds[i + 1]]
+        column = np.full(len(keys), np.nan)
+        column[rows[part]] = prices[part]
+        columns[partner] = _compact(column)
+    return pd.DataFrame(columns, index=keys)
+
+
+def aggregate_bids(combined_df: pd.DataFrame, sparse: bool = False) -> pd.DataFrame:
+    """Pick the winning partner(s) per product key and lay out the partner price matrix.
+
+    With `sparse`, partner columns quoted for less than SPARSE_MAX_DENSITY of the keys are
+    SparseDtype with NaN for "no quote", so the table grows with the number of quotes rather
+    than keys x partners; to_wide() makes them dense again.
+    """
+    df = combined_df
+    if PRODUCT_KEY_COLUMN not in df.columns:
+        df = df.assign(**{PRODUCT_KEY_COLUMN: build_product_key(df)})
+    price_dtype = df[PRICE_COLUMN].dtype
+    all_partners = df[PARTNER_COLUMN].unique().tolist()
+
+    # Key columns come from the first row of each product key; ids follow sorted key order
+    base = df.loc[~df[PRODUCT_KEY_COLUMN].duplicated(), [PRODUCT_KEY_COLUMN] + KEY_COLUMNS]
+    base = base.set_index(PRODUCT_KEY_COLUMN).sort_index()
+
+    # Only consider prices > 0 (participating suppliers); a partner's last quote wins,
+    # partners keep the order of their first quote for the winners list
+    bids = df.loc[df[PRICE_COLUMN] > 0, [PRODUCT_KEY_COLUMN, PARTNER_COLUMN, PRICE_COLUMN]]
+    quotes = bids.groupby([PRODUCT_KEY_COLUMN, PARTNER_COLUMN], sort=False, dropna=False)[PRICE_COLUMN].last()
+
+    key_level = quotes.index.get_level_values(0)
+    min_price = quotes.groupby(level=0, sort=False).min()
+    winners = quotes[quotes.to_numpy() == min_price.reindex(key_level).to_numpy()]
+    winner_str = _join_by_key(winners.index.get_level_values(0), winners.index.get_level_values(1))
+
+    if sparse:
+        matrix = _sparse_matrix(quotes, base.index, all_partners)
+    else:
+        matrix = quotes.unstack(PARTNER_COLUMN).reindex(index=base.index, columns=all_partners)
+        matrix = _restore_int_columns(matrix, price_dtype)
+
+    quantity = base['Quantity']
+    min_price = min_price.reindex(base.index)
+    if min_price.notna().all():
+        min_price = min_price.astype(price_dtype)
+
+    bidding_df = base.copy()
+    bidding_df['Bid Selected Partners'] = winner_str.reindex(base.index)
+    bidding_df['Bid Selected Price'] = min_price
+    bidding_df['Bid Selected Unit Price'] = (min_price / quantity).where(quantity.ne(0) & min_price.notna())
+    bidding_df = pd.concat([bidding_df, matrix], axis=1).reset_index(drop=True)
+    bidding_df.attrs[PARTNER_COLUMNS_ATTR] = [str(partner) for partner in all_partners]
+    return bidding_df
+
+
+def _dense_prices(bidding_df: pd.DataFrame, partners: list[str]) -> np.ndarray:
+    if not partners:
+        return np.empty((len(bidding_df), 0))
+    return bidding_df[partners].to_numpy(dtype=float, na_value=np.nan)
+
+
+def to_wide(bidding_df: pd.DataFrame) -> pd.DataFrame:
+    """The table with a sparse partner matrix turned into ordinary dense columns."""
+    sparse = {col: dtype.subtype for col, dtype in bidding_df.dtypes.items() if isinstance(dtype, pd.SparseDtype)}
+    return bidding_df.astype(sparse) if sparse else bidding_df
+
+
+def partner_quotes(bidding_df: pd.DataFrame) -> pd.DataFrame:
+    """Long layout of the partner price matrix: one row per product key and quoting partner.
+
+    Rows follow the bidding table's key order, partners their column order; keys without any
+    quote are left out. Each row carries the key columns, 'Partner Name', 'Printer Cost' and
+    'Bid Selected' (whether the partner is one of the key's winners).
+    """
+    rows, cols, prices = [], [], []
+    for i, partner in enumerate(partner_columns(bidding_df)):
+        values = bidding_df[partner].array
+        if isinstance(values, pd.arrays.SparseArray):
+            positions, quoted = values.sp_index.indices, values.sp_values
+        else:
+            quoted = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            positions = np.flatnonzero(~np.isnan(quoted))
+            quoted = quoted[positions]
+        keep = quoted > 0
+        rows.append(positions[keep])
+        cols.append(np.full(keep.sum(), i))
+        prices.append(quoted[keep])
+    rows, cols, prices = (np.concatenate(part) if part else np.array([]) for part in (rows, cols, prices))
+    order = np.lexsort((cols, rows))
+    rows, cols, prices = rows[order].astype(np.intp), cols[order].astype(np.intp), prices[order]
+
+    quotes = bidding_df[KEY_COLUMNS].iloc[rows].reset_index(drop=True)
+    quotes[PARTNER_COLUMN] = pd.Categorical.from_codes(cols, categories=partner_columns(bidding_df))
+    quotes[PRICE_COLUMN] = prices
+    quotes['Bid Selected'] = prices == bidding_df['Bid Selected Price'].to_numpy(dtype=float, na_value=np.nan)[rows]
+    return quotes
+
+
+def _ordinal(n: int) -> str:
+    suffix = 'th' if n % 100 in (11, 12, 13) else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f'{n}{suffix}'
+
+
+def ranking_columns(depth: int = RANK_DEPTH) -> list[str]:
+    return [f'{_ordinal(rank)} Best {field}' for rank in range(2, depth + 1) for field in ('Partner', 'Price', 'Gap')]
+
+
+def rank_partners(bidding_df: pd.DataFrame, depth: int = RANK_DEPTH) -> pd.DataFrame:
+    """Runner-up partners of each product key with their price and gap to the winning price.
+
+    The winners, all partners at the lowest price, are in 'Bid Selected Partners'; the 2nd best
+    is the cheapest of the others. Equal prices rank in partner column order (the order of the
+    partners' first quote), so ties resolve the same way on every run. Each rank is one argmin
+    over the partner price matrix, so the cost is rows x partners x ranks, without per-row Python.
+    """
+    partners = partner_columns(bidding_df)
+    names = np.array(partners + [None], dtype=object)
+    best = bidding_df['Bid Selected Price'].to_numpy(dtype=float, na_value=np.nan)
+    ranks = range(2, depth + 1)
+    found_partner = np.empty((len(ranks), len(bidding_df)), dtype=object)
+    found_price = np.full((len(ranks), len(bidding_df)), np.nan)
+
+    # Row blocks bound the dense copy of a sparse matrix
+    for start in range(0, len(bidding_df), CHUNK_ROWS):
+        block = slice(start, start + CHUNK_ROWS)
+        prices = _dense_prices(bidding_df.iloc[block], partners)
+        # Non-participating partners and the winners never rank
+        prices = np.where((prices > 0) & (prices != best[block, None]), prices, np.inf)
+        prices = np.column_stack([prices, np.full(len(prices), np.inf)])
+        rows = np.arange(len(prices))
+        for i in range(len(ranks)):
+            col = prices.argmin(axis=1)  # first of equal prices
+            price = prices[rows, col]
+            found = np.isfinite(price)
+            found_partner[i, block] = np.where(found, names[col], None)
+            found_price[i, block] = np.where(found, price, np.nan)
+            prices[rows, col] = np.inf
+
+    columns = iter(ranking_columns(depth))
+    ranking = {}
+    for i in range(len(ranks)):
+        ranking[next(columns)] = pd.array(found_partner[i], dtype='str')
+        ranking[next(columns)] = found_price[i]
+        ranking[next(columns)] = np.round(found_price[i] - best, 2)
+    return pd.DataFrame(ranking, index=bidding_df.index)
+
+
+def add_ranking(bidding_df: pd.DataFrame, depth: int = RANK_DEPTH) -> pd.DataFrame:
+    """Insert the rank_partners columns between the winning bid and the partner price matrix."""
+    ranking = rank_partners(bidding_df, depth)
+    position = bidding_df.columns.get_loc('Bid Selected Unit Price') + 1
+    out = pd.concat([bidding_df.iloc[:, :position], ranking, bidding_df.iloc[:, position:]], axis=1)
+    out.attrs = dict(bidding_df.attrs)
+    return out
+
+
+def customer_price_column(markup_percentage: float) -> str:
+    return f'Customer Price ({markup_percentage}%)'
+
+
+def apply_markup(bidding_df: pd.DataFrame, markup_percentage: float) -> pd.DataFrame:
+    """Add the customer price columns to an aggregated bid table without touching the rest."""
+    min_price = bidding_df['Bid Selected Price']
+    quantity = bidding_df['Quantity']
+    customer_price = (min_price * (1 + markup_percentage / 100)).round()
+    if customer_price.notna().all():
+        customer_price = customer_price.astype('int64')
+
+    out = bidding_df.copy(deep=False)
+    position = out.columns.get_loc('Bid Selected Price') + 1
+    out.insert(position, customer_price_column(markup_percentage), customer_price)
+    position = out.columns.get_loc('Bid Selected Unit Price') + 1
+    out.insert(position, 'Customer Unit Price', (customer_price / quantity).where(quantity.ne(0) & min_price.notna()))
+    out.attrs[MARKUP_ATTR] = markup_percentage
+    return out
@@ -1,69 +1,27 @@
 import streamlit as st
 import pandas as pd
-import io
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill
-from openpyxl.utils.dataframe import dataframe_to_rows
-
-# Required columns for bidding sheet
-REQUIRED_COLUMNS = [
-    'Category',
-    'Dandpo SKU',
-    'Combinations',
-    'Printer Specifications',
-    'Quantity',
-    'Sample',
-    'Printer Cost',
-    'Lead Time',
-    'Weight in kg',
-    'Partner Name'
-]
-
-KEY_COLUMNS = [
-    'Category',
-    'Dandpo SKU',
-    'Combinations',
-    'Printer Specifications',
-    'Quantity',
-    'Sample',
-    'Lead Time',
-    'Weight in kg'
-]
-
-PRICE_COLUMN = 'Printer Cost'
-PARTNER_COLUMN = 'Partner Name'
-
-def validate_columns(df, filename):
-    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-    if missing:
-        raise ValueError(f"File {filename} is missing columns: {', '.join(missing)}")
-    return df
+import numpy as np
+import hashlib
+from datetime import date
+
+from bidding_core import apply_markup, ranking_columns, to_wide
+from pipeline import rank_bids, update_bids
+from preview import paginated_preview, price_match_mask, run_in_background
+from instrumentation import measure, observe
+from result_cache import cache
+from price_history import PRICE_DELTA_COLUMN, PREVIOUS_PRICE_COLUMN, previous_best, record_round_async, round_key
+from normalization import NORMALIZE_COLUMNS, NORMALIZE_MODEL, Normalizer, openai
+from partitioned import PARTITION_MEMORY_MB
+from excel_export import bidding_sheet_xlsx, lazy_download, partner_quotes_csv_bytes, partner_quotes_parquet_bytes, to_csv_bytes, to_parquet_bytes
 
 def generate_colored_excel(df):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Bidding Sheet"
-    green_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-    for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-        ws.append(row)
-        if r_idx == 1:
-            continue
-        bid_price = row[df.columns.get_loc("Bid Selected Price")]
-        for col_idx, cell_val in enumerate(row, 1):
-            if isinstance(cell_val, (int, float)) and isinstance(bid_price, (int, float)) and round(cell_val, 2) == round(bid_price, 2):
-                ws.cell(row=r_idx, column=col_idx).fill = green_fill
-    bio = io.BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return bio
-
-def style_dataframe(df):
-    def highlight_min_price(row):
-        bid_price = row.get("Bid Selected Price")
-        return [
-            "background-color: #90EE90" if isinstance(col_val, (int, float)) and round(col_val, 2) == round(bid_price, 2) else ""
-            for col_val in row
-        ]
+    return bidding_sheet_xlsx(df)
+
+def style_dataframe(df, mask=None):
+    # Highlight mask comes from array comparisons; callers may pass a precomputed slice
+    if mask is None:
+        mask = price_match_mask(df, "Bid Selected Price")
+    css = np.where(mask, "background-color: #90EE90", "")
 
     def format_cell(col):
         def formatter(x):
@@ -77,13 +35,73 @@ def style_dataframe(df):
         return formatter
 
     formatters = {col: format_cell(col) for col in df.columns}
-    return df.style.apply(highlight_min_price, axis=1).format(formatters, na_rep="")
+    return df.style.apply(lambda _: css, axis=None).format(formatters, na_rep="")
+
+def _upload_key(uploaded_files, normalize=False):
+    # Content hash of every upload, in upload order; names are kept for error messages.
+    # Normalized spellings give other product keys, so such rounds are cached and recorded apart
+    key = tuple((file.name, hashlib.sha256(file.getvalue()).hexdigest()) for file in uploaded_files)
+    return key + (("normalized", NORMALIZE_MODEL),) if normalize else key
+
+# The shared cache hands back the same table object to every session and rerun, which keeps
+# the lazily built downloads memoized; the cached tables are never mutated
+def _load_bids(upload_key, uploaded_files, previous, normalize=False, memory_mb=None):
+    """Parse, validate and aggregate the uploads; cached on the content hash so markup changes skip it.
+
+    When a supplier re-submits, only the product keys of the changed file are aggregated again,
+    starting from the session's previous round. With a memory budget the round is aggregated
+    out of core instead; the table is the same, so it shares the cache entry.
+    """
+    def compute():
+        normalizer = Normalizer() if normalize else None
+        round_ = update_bids(uploaded_files, previous, cache=cache, normalizer=normalizer, memory_mb=memory_mb)
+        round_["normalization"] = normalizer.stats if normalizer else None
+        return round_
+
+    return cache.get_or_compute(("bids", upload_key), compute)
+
+def _apply_markup(bids_df, markup_percentage):
+    with measure('markup') as perf:
+        priced = apply_markup(bids_df, markup_percentage)
+        observe(perf, priced)
+    return priced
+
+def _priced_bids(upload_key, markup_percentage, bids_df):
+    return cache.get_or_compute(("priced_bids", upload_key, markup_percentage),
+                                lambda: _apply_markup(bids_df, markup_percentage))
+
+def _price_history(upload_key, bids_df):
+    """Previous-round best price per product key; the round itself is recorded in the background"""
+    key = round_key(file_hash for _, file_hash in upload_key)
+
+    def lookup():
+        with measure("price_history") as perf:
+            history = previous_best(bids_df, key)
+            observe(perf, history)
+        return history
+
+    history = cache.get_or_compute(("price_history", key, date.today().isoformat()), lookup)
+    cache.get_or_compute(("price_history_recorded", key), lambda: record_round_async(bids_df, key))
+    return history
+
+# Stages of a full round, for the progress bar of the background job
+BIDDING_STAGES = ["ingestion", "change_detection", "key_building", "aggregation", "ranking", "price_history"]
+OUT_OF_CORE_STAGES = ["partitioning", "aggregation", "merge", "ranking", "price_history"]
+
+def _bid_round(upload_key, uploaded_files, previous, normalize=False, memory_mb=None):
+    # Runs as a background job, so it must not touch the session
+    round_ = _load_bids(upload_key, uploaded_files, previous, normalize, memory_mb)
+    if round_["bids"] is None:
+        return round_, None, None
+    # The session keeps the unranked round, which is what the next incremental update patches
+    ranked_df = cache.get_or_compute(("ranked_bids", upload_key), lambda: rank_bids(round_["bids"]))
+    return round_, ranked_df, _price_history(upload_key, round_["bids"])
 
 def bidding_sheet_builder():
     """Main function for Bidding Sheet Builder tab"""
     
     uploaded_files = st.file_uploader(
-        "Upload Supplier Cost Sheets (CSV format)", type=["csv"], accept_multiple_files=True, key="bidding_uploader"
+        "Upload Supplier Cost Sheets (CSV or Excel)", type=["csv", "xlsx", "xlsm"], accept_multiple_files=True, key="bidding_uploader"
     )
     
     # Simple sample file download
@@ -137,83 +155,113 @@ def bidding_sheet_builder():
         st.session_state.bidding_previous_value = markup_percentage
             
         st.write(f"**Current markup:** {st.session_state.bidding_applied_percentage}% (Customer Price = Bid Price × {1 + st.session_state.bidding_applied_percentage/100:.2f})")
-        # Show loader for data processing
-        with st.spinner("🔄 Processing supplier data..."):
-            all_data = []
-            for file in uploaded_files:
-                try:
-                    df = pd.read_csv(file)
-                    # Clean empty rows and NaN values
-                    df = df.dropna(how='all')  # Remove completely empty rows
-                    df = df.fillna('')  # Replace NaN with empty string
-                    
-                    # Convert numeric columns to proper data types
-                    numeric_columns = ['Quantity', 'Printer Cost', 'Lead Time', 'Weight in kg']
-                    for col in numeric_columns:
-                        if col in df.columns:
-                            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-                    
-                    validate_columns(df, file.name)
-                    all_data.append(df)
-                except Exception as e:
-                    st.error(f"❌ {file.name}: {e}")
-                    st.stop()
-            combined_df = pd.concat(all_data, ignore_index=True)
-        combined_df['Product Key'] = combined_df[KEY_COLUMNS].astype(str).agg(' | '.join, axis=1)
-        grouped = combined_df.groupby('Product Key')
-        output_rows = []
-        all_partners = combined_df[PARTNER_COLUMN].unique().tolist()
-        for key, group in grouped:
-            base_data = group.iloc[0][KEY_COLUMNS].to_dict()
-            quantity = group.iloc[0]['Quantity']
-            partner_prices = {}
-            for _, row in group.iterrows():
-                partner = row[PARTNER_COLUMN]
-                price = row[PRICE_COLUMN]
-                # Only consider prices > 0 (participating suppliers)
-                if pd.notna(price) and price > 0:
-                    partner_prices[partner] = price
-            if partner_prices:
-                min_price = min(partner_prices.values())
-                winners = [k for k, v in partner_prices.items() if v == min_price]
-                winner_str = ", ".join(winners)
-            else:
-                min_price = None
-                winner_str = None
-            # Calculate customer price using the applied percentage
-            customer_price = int(round(min_price * (1 + st.session_state.bidding_applied_percentage/100))) if min_price is not None else None
-            unit_price = min_price / quantity if min_price is not None and quantity else None
-            customer_unit_price = customer_price / quantity if customer_price is not None and quantity else None
-
-            output_row = {
-                **base_data,
-                'Bid Selected Partners': winner_str,
-                'Bid Selected Price': min_price,
-                f'Customer Price ({st.session_state.bidding_applied_percentage}%)': customer_price,
-                'Bid Selected Unit Price': unit_price,
-                'Customer Unit Price': customer_unit_price
-            }
-            for partner in all_partners:
-                output_row[partner] = partner_prices.get(partner, None)
-            output_rows.append(output_row)
-
-        bidding_df = pd.DataFrame(output_rows)
+        normalize = st.checkbox(
+            f"Normalize spellings of {' and '.join(NORMALIZE_COLUMNS)}",
+            key="bidding_normalize",
+            disabled=openai is None,
+            help="Variants such as 'Red, L' / 'red,L' or 'DTG Print' / 'DTG' are mapped to one canonical "
+                 "spelling by the language model, so they form one product. Only spellings not seen "
+                 "before are sent; the mappings are kept locally for later rounds."
+                 + (" Needs the openai package." if openai is None else "")
+        )
+        out_of_core = st.checkbox(
+            "Aggregate out of core",
+            key="bidding_out_of_core",
+            help="For rounds larger than the server's memory: supplier rows are spilled to disk by product "
+                 "key and aggregated a slice at a time. The bidding sheet is the same."
+        )
+        memory_mb = None
+        if out_of_core:
+            memory_mb = st.number_input(
+                "Memory budget (MB)", min_value=64, value=int(PARTITION_MEMORY_MB), step=64, key="bidding_memory_mb",
+                help="Aggregation aims to stay within this, besides the largest single file and the finished sheet"
+            )
+        # The round is built by a background job, which keeps going across reruns and can be cancelled
+        upload_key = _upload_key(uploaded_files, normalize)
+        previous = st.session_state.get("bidding_round")
+        if memory_mb is not None:
+            stages = OUT_OF_CORE_STAGES
+        elif normalize:
+            stages = BIDDING_STAGES[:1] + ["normalization"] + BIDDING_STAGES[1:]
+        else:
+            stages = BIDDING_STAGES
+        round_, ranked_df, history = run_in_background(
+            "bidding", ("bidding", upload_key),
+            lambda: _bid_round(upload_key, uploaded_files, previous, normalize, memory_mb),
+            "🔄 Processing supplier data", stages
+        )
+        st.session_state.bidding_round = round_
+        bids_df, errors = ranked_df, round_["errors"]
+        normalization = round_.get("normalization")
+        if normalization:
+            st.caption(f"Normalized {normalization['distinct']:,} distinct spellings: {normalization['cached']:,} "
+                       f"from the local mappings, {normalization['requested']:,} sent in "
+                       f"{normalization['requests']:,} request(s).")
+            if normalization["failed"]:
+                st.warning(f"⚠️ {normalization['failed']:,} spellings could not be normalized and were kept "
+                           "as they are; they are sent again next time.")
+        if errors:
+            report = "\n".join(f"- **{name}**: {error}" for name, error in errors)
+            st.error(f"❌ {len(errors)} of {len(uploaded_files)} file(s) could not be used and were skipped:\n\n{report}")
+        if bids_df is None:
+            st.stop()
+        # Only the customer price columns depend on the markup
+        bidding_df = _priced_bids(upload_key, st.session_state.bidding_applied_percentage, bids_df)
         st.subheader("📄 Bidding Sheet Preview")
-        st.dataframe(style_dataframe(bidding_df), use_container_width=True)
+        # Last round's best price sits next to this round's prices in the preview only
+        position = bidding_df.columns.get_loc("Customer Unit Price") + 1
+        preview_df = pd.concat([bidding_df.iloc[:, :position], history, bidding_df.iloc[:, position:]], axis=1)
+        history_columns = slice(position, position + history.shape[1])
+
+        def style_page(page, rows):
+            # Only the visible page of the sparse partner matrix is made wide and highlighted
+            page = to_wide(page)
+            mask = price_match_mask(page, "Bid Selected Price")
+            mask[:, history_columns] = False
+            mask[:, page.columns.isin(ranking_columns())] = False
+            return style_dataframe(page, mask)
+        compared = history[PREVIOUS_PRICE_COLUMN].notna()
+        if compared.any():
+            delta = history[PRICE_DELTA_COLUMN]
+            st.caption(f"Compared with the previous round for {compared.sum():,} of {len(history):,} products: "
+                       f"{(delta < 0).sum():,} cheaper, {(delta > 0).sum():,} dearer, {(delta == 0).sum():,} unchanged.")
+        paginated_preview(preview_df, "bidding_preview", style_page)
 
-        csv_bytes = bidding_df.to_csv(index=False).encode("utf-8")
+        # Files are only built when a download is requested
         st.download_button(
             "📥 Download as CSV",
-            csv_bytes,
+            lazy_download(bidding_df, to_csv_bytes),
             file_name="Bidding Sheet.csv",
             mime="text/csv"
         )
-        excel_file = generate_colored_excel(bidding_df)
         st.download_button(
             "📥 Download as Excel (Colored)",
-            excel_file,
+            lazy_download(bidding_df, generate_colored_excel),
             file_name="Bidding Sheet.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+        st.download_button(
+            "📥 Download as Parquet",
+            lazy_download(bidding_df, to_parquet_bytes),
+            file_name="Bidding Sheet.parquet",
+            mime="application/vnd.apache.parquet",
+            help="Typed and compact; the Catalog Sheet Builder and Catalog QC read it without re-parsing"
+        )
+        # Long layout: one row per product and quoting partner, so its size follows the quotes
+        # rather than products × partners
+        st.download_button(
+            "📥 Download partner quotes as CSV (long layout)",
+            lazy_download(bidding_df, partner_quotes_csv_bytes),
+            file_name="Bidding Quotes.csv",
+            mime="text/csv",
+            help="One row per product and quoting partner instead of one column per partner"
+        )
+        st.download_button(
+            "📥 Download partner quotes as Parquet (long layout)",
+            lazy_download(bidding_df, partner_quotes_parquet_bytes),
+            file_name="Bidding Quotes.parquet",
+            mime="application/vnd.apache.parquet",
+            help="One row per product and quoting partner instead of one column per partner"
+        )
     else:
-        st.info("Please upload at least one supplier cost sheet in CSV format.")
+        st.info("Please upload at least one supplier cost sheet (CSV or Excel).")
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from bidding_core import MARKUP_ATTR, PARTNER_COLUMNS_ATTR, customer_price_column, ranking_columns
+from ingestion import clean_frame, is_excel, is_parquet, read_csv_sheet, read_excel, read_header, read_parquet
+
+# Required columns for catalog sheet
+KEY_COLUMNS = [
+    'Category',
+    'Dandpo SKU',
+    'Combinations',
+    'Printer Specifications',
+    'Quantity',
+    'Sample',
+    'Lead Time',
+    'Weight in kg'
+]
+
+# Columns a bidding sheet needs to become a catalog sheet
+REQUIRED_BIDDING_COLUMNS = KEY_COLUMNS + ['Bid Selected Price']
+
+BIDDING_NUMERIC_COLUMNS = ['Quantity', 'Bid Selected Price', 'Lead Time', 'Weight in kg', 'Bid Selected Unit Price', 'Customer Unit Price']
+
+CATALOG_COLUMNS = [
+    'Category', 'Dandpo SKU', 'Combinations', 'Printer Specifications',
+    'Quantity', 'Sample', 'Lead Time', 'Weight in kg', 'Printer Cost',
+    'Customer Price', 'Unit Price for Printer cost', 'Unit Price for customer cost',
+    'Partners', 'Production Type', 'Production Time (Hours)',
+    'Printer Delivery to Dandpo (Hours)', 'Packaging Dimensions', 'Product Dimensions'
+]
+
+# Bidding sheet columns that are neither key columns nor partner prices
+BID_COLUMNS = ['Bid Selected Partners', 'Bid Selected Price', 'Bid Selected Unit Price', 'Customer Unit Price'] + ranking_columns()
+
+
+def _numeric_columns(header) -> list[str]:
+    return BIDDING_NUMERIC_COLUMNS + [col for col in header if 'Customer Price' in str(col)]
+
+
+def validate_bidding_columns(columns, filename):
+    missing = [col for col in REQUIRED_BIDDING_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"File {filename} is not a bidding sheet, it is missing columns: {', '.join(missing)}")
+    return columns
+
+
+def read_bidding_sheet(source, sheet_name: str | None = None) -> pd.DataFrame:
+    filename = getattr(source, 'name', source)
+    if is_parquet(source):
+        # Written by the bidding builder: typed, with markup and partner columns in its attrs
+        df = read_parquet(source)
+        validate_bidding_columns(df.columns, filename)
+        return df
+    if is_excel(source):
+        # A workbook is parsed whole, so its header comes from the parsed worksheet
+        df = read_excel(source, sheet_name)
+        validate_bidding_columns(df.columns, filename)
+        return clean_frame(df, _numeric_columns(df.columns))
+    # Convert numeric columns (including customer price columns) to proper data types
+    header = validate_bidding_columns(read_header(source), filename)
+    return read_csv_sheet(source, _numeric_columns(header))
+
+
+def partner_columns(bidding_df: pd.DataFrame) -> list[str]:
+    if PARTNER_COLUMNS_ATTR in bidding_df.attrs:
+        return [col for col in bidding_df.attrs[PARTNER_COLUMNS_ATTR] if col in bidding_df.columns]
+    return [
+        col for col in bidding_df.columns
+        if col not in CATALOG_COLUMNS and col not in KEY_COLUMNS and col not in BID_COLUMNS
+        and 'Customer Price' not in col
+    ]
+
+
+def bidding_partners(bidding_df: pd.DataFrame, partner_cols: list[str]) -> np.ndarray:
+    """', '-joined names of the partners with a positive price, per row."""
+    partners = np.full(len(bidding_df), '', dtype=object)
+    for name in partner_cols:
+        # Prices may arrive as numbers or, after a CSV round trip, as text with '' for no bid
+        quoted = (pd.to_numeric(bidding_df[name], errors='coerce') > 0).to_numpy()
+        listed = partners[quoted]
+        partners[quoted] = np.where(listed == '', name, listed + ', ' + name)
+    return partners
+
+
+def build_catalog_sheet(bidding_df: pd.DataFrame, markup_percentage: float = 0.0) -> pd.DataFrame:
+    """Turn a bidding sheet into the catalog layout, optionally re-pricing at a new markup."""
+    quantity = bidding_df['Quantity'].astype(float).replace(0, float('nan'))
+    printer_cost = bidding_df['Bid Selected Price']
+
+    if MARKUP_ATTR in bidding_df.attrs:
+        customer_price_col = customer_price_column(bidding_df.attrs[MARKUP_ATTR])
+    else:
+        customer_price_col = next((col for col in bidding_df.columns if 'Customer Price' in col), None)
+    if markup_percentage > 0:
+        customer_price_col = f'Customer Price ({markup_percentage}%)'
+        customer_price = (printer_cost.astype(float) * (1 + markup_percentage / 100)).round().astype('Int64')
+        customer_unit_price = (customer_price / quantity).round(2)
+    else:
+        if customer_price_col is None:
+            customer_price_col = 'Customer Price'
+            customer_price = printer_cost.astype(float)
+        else:
+            customer_price = bidding_df[customer_price_col]
+        customer_unit_price = bidding_df.get('Customer Unit Price', customer_price / quantity).round(2)
+
+    columns = {col: bidding_df[col] for col in KEY_COLUMNS}
+    columns['Printer Cost'] = printer_cost
+    columns[customer_price_col] = customer_price
+    columns['Unit Price for Printer cost'] = bidding_df.get(
+        'Bid Selected Unit Price', printer_cost.astype(float) / quantity).round(2)
+    columns['Unit Price for customer cost'] = customer_unit_price
+    columns['Partners'] = bidding_partners(bidding_df, partner_columns(bidding_df))
+    for col in CATALOG_COLUMNS:
+        if col not in columns and col != 'Customer Price':
+            columns[col] = ''
+    return pd.DataFrame(columns, index=bidding_df.index)
@@ -1,21 +1,25 @@
 import io
 import streamlit as st
 import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill
+import numpy as np
+from ingestion import clean_frame, is_parquet, read_table
+from preview import paginated_preview, run_in_background, worksheet_picker
+from qc_core import DUPLICATE_POLICIES, DuplicateKeyError, compare_catalogs
+from reference_store import compare_with_reference, delete_reference, list_references, save_reference
+from excel_export import qc_report_xlsx, lazy_download
+from instrumentation import measure, observe
+from result_cache import cache, upload_hash
 
 # Default column suggestions
 DEFAULT_SKU_COL = 'Dandpo SKU'
 DEFAULT_QTY_COL = 'Quantity'
 
+SHEET_TYPES = ['csv', 'xlsx', 'xlsm', 'parquet']
+
 
 def _clean_df(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.dropna(how='all')
-    df = df.fillna('')
     # Try convert Quantity to numeric safely
-    if 'Quantity' in df.columns:
-        df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(0)
-    return df
+    return clean_frame(df, numeric_columns=['Quantity'])
 
 
 def _suggest_price_column(columns: list[str]) -> str | None:
@@ -40,81 +44,103 @@ def _suggest_column(columns: list[str], default_name: str) -> str | None:
     return None
 
 
-def _build_product_key(df: pd.DataFrame, sku_col: str, qty_col: str) -> pd.Series:
-    key_cols = [sku_col, qty_col]
-    return df[key_cols].astype(str).agg(' | '.join, axis=1)
-
-
-def _styled_preview(qc_df: pd.DataFrame):
-    def color_row(row):
-        status = row.get('QC Status', '')
-        color = ''
-        if status == 'MATCH':
-            color = 'background-color: #90EE90'  # green
-        elif status == 'MISMATCH':
-            color = 'background-color: #FF7F7F'  # red
-        elif status == 'MISSING':
-            color = 'background-color: #FFF59D'  # yellow
-        return [color] * len(row)
-
-    return qc_df.style.apply(color_row, axis=1)
+def _read_sheet(upload, sheet_name=None):
+    # Cached on content, format and worksheet, so re-runs and other sessions skip parsing
+    def read():
+        with measure('read_sheet') as perf:
+            df = _clean_df(read_table(upload, sheet_name))
+            observe(perf, df)
+        return df
+    return cache.get_or_compute(('qc_sheet', upload_hash(upload), is_parquet(upload), sheet_name), read)
+
+
+def _show_duplicates(duplicates: dict[str, pd.DataFrame]):
+    with st.expander('Duplicate keys'):
+        for sheet, dups in duplicates.items():
+            if len(dups):
+                st.markdown(f'**{sheet}** ({len(dups)} keys)')
+                st.dataframe(dups, use_container_width=True)
+
+
+STATUS_CSS = {
+    'MATCH': 'background-color: #90EE90',  # green
+    'MISMATCH': 'background-color: #FF7F7F',  # red
+    'MISSING': 'background-color: #FFF59D',  # yellow
+}
+
+
+def _styled_preview(qc_df: pd.DataFrame, row_css=None):
+    # One CSS string per row from the status column, broadcast across the columns
+    if row_css is None:
+        row_css = qc_df['QC Status'].map(STATUS_CSS).fillna('').to_numpy()
+    css = np.repeat(np.asarray(row_css, dtype=object)[:, None], len(qc_df.columns), axis=1)
+    return qc_df.style.apply(lambda _: css, axis=None)
+
+
+def _save_reference_form(df_a: pd.DataFrame, sku_col: str, qty_col: str, price_col: str,
+                         duplicate_policy: str, references: pd.DataFrame):
+    with st.expander('💾 Save Sheet A as a reference catalog'):
+        name = st.text_input('Reference name', value='Master catalog', key='qc_reference_name')
+        if name in set(references['name']):
+            st.caption(f'"{name}" already exists and will be replaced.')
+        save_col, delete_col = st.columns(2)
+        with save_col:
+            if st.button('Save reference', key='qc_save_reference', disabled=not name.strip()):
+                try:
+                    count = save_reference(name.strip(), df_a, sku_col, qty_col, price_col, duplicates=duplicate_policy)
+                    st.success(f'Saved {count:,} keys as "{name.strip()}".')
+                except DuplicateKeyError as e:
+                    st.error(f'{e}. Choose an aggregation for duplicate keys before saving.')
+        with delete_col:
+            if name in set(references['name']) and st.button('Delete reference', key='qc_delete_reference'):
+                delete_reference(name)
+                st.success(f'Deleted "{name}".')
 
 
 def _excel_with_colors(qc_df: pd.DataFrame) -> io.BytesIO:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Catalog QC'
-
-    green = PatternFill(start_color='90EE90', end_color='90EE90', fill_type='solid')
-    red = PatternFill(start_color='FF7F7F', end_color='FF7F7F', fill_type='solid')
-    yellow = PatternFill(start_color='FFF59D', end_color='FFF59D', fill_type='solid')
-
-    # Write header
-    ws.append(list(qc_df.columns))
-
-    status_idx = qc_df.columns.get_loc('QC Status')
-
-    for _, row in qc_df.iterrows():
-        values = [row[col] for col in qc_df.columns]
-        ws.append(values)
-        # Apply row color by status
-        status = str(row['QC Status'])
-        fill = None
-        if status == 'MATCH':
-            fill = green
-        elif status == 'MISMATCH':
-            fill = red
-        elif status == 'MISSING':
-            fill = yellow
-        if fill is not None:
-            r = ws.max_row
-            for c in range(1, len(qc_df.columns) + 1):
-                ws.cell(row=r, column=c).fill = fill
-
-    bio = io.BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return bio
+    return qc_report_xlsx(qc_df)
 
 
 def catalog_qc():
     st.header('🧪 Catalog QC')
 
+    references = list_references()
+    source_a = st.radio('Sheet A source', ['Upload', 'Saved reference'], horizontal=True, key='qc_a_source',
+                        help='Compare against a reference catalog saved from an earlier QC run')
+    use_reference = source_a == 'Saved reference'
+
     col_left, col_right = st.columns(2)
 
+    file_a = sheet_name_a = reference_name = reference_saved_at = None
     with col_left:
-        file_a = st.file_uploader('Upload Sheet A (CSV)', type=['csv'], key='qc_a')
+        if use_reference:
+            if references.empty:
+                st.info('No reference catalogs saved yet. Upload Sheet A and save it as a reference.')
+            else:
+                reference_name = st.selectbox('Reference catalog', options=list(references['name']), key='qc_reference')
+                ref = references.set_index('name').loc[reference_name]
+                reference_saved_at = ref['saved_at']
+                st.caption(f"{ref['row_count']:,} keys on {ref['sku_col']} / {ref['qty_col']}, "
+                           f"price {ref['price_col']}, saved {ref['saved_at']}")
+        else:
+            file_a = st.file_uploader('Upload Sheet A (CSV, Excel or Parquet)', type=SHEET_TYPES, key='qc_a')
+            sheet_name_a = worksheet_picker(file_a, 'qc_a_worksheet')
     with col_right:
-        file_b = st.file_uploader('Upload Sheet B (CSV)', type=['csv'], key='qc_b')
+        file_b = st.file_uploader('Upload Sheet B (CSV, Excel or Parquet)', type=SHEET_TYPES, key='qc_b')
+        sheet_name_b = worksheet_picker(file_b, 'qc_b_worksheet')
 
-    if not (file_a and file_b):
+    if not ((file_a or reference_name) and file_b):
         st.info('Upload both sheets to start QC.')
         return
 
-    # Read and clean
+    # Read and clean in a background job that keeps going across reruns and can be cancelled
+    def read():
+        return _read_sheet(file_a, sheet_name_a) if file_a else None, _read_sheet(file_b, sheet_name_b)
+
+    read_key = ('qc_read', upload_hash(file_a) if file_a else None, file_a and is_parquet(file_a), sheet_name_a,
+                upload_hash(file_b), is_parquet(file_b), sheet_name_b)
     try:
-        df_a = _clean_df(pd.read_csv(file_a))
-        df_b = _clean_df(pd.read_csv(file_b))
+        df_a, df_b = run_in_background('qc_read', read_key, read, 'Reading sheets', ['read_sheet'])
     except Exception as e:
         st.error(f'Failed to read files: {e}')
         return
@@ -125,10 +151,11 @@ def catalog_qc():
     # SKU column selection
     st.markdown('**SKU Column (mandatory):**')
     with col_left:
-        default_sku_a = _suggest_column(list(df_a.columns), DEFAULT_SKU_COL)
-        sku_col_a = st.selectbox('SKU column in Sheet A', options=list(df_a.columns), 
-                                index=(list(df_a.columns).index(default_sku_a) if default_sku_a in df_a.columns else 0), 
-                                key='sku_a')
+        if df_a is not None:
+            default_sku_a = _suggest_column(list(df_a.columns), DEFAULT_SKU_COL)
+            sku_col_a = st.selectbox('SKU column in Sheet A', options=list(df_a.columns), 
+                                    index=(list(df_a.columns).index(default_sku_a) if default_sku_a in df_a.columns else 0), 
+                                    key='sku_a')
     with col_right:
         default_sku_b = _suggest_column(list(df_b.columns), DEFAULT_SKU_COL)
         sku_col_b = st.selectbox('SKU column in Sheet B', options=list(df_b.columns), 
@@ -138,10 +165,11 @@ def catalog_qc():
     # Quantity column selection
     st.markdown('**Quantity Column (mandatory):**')
     with col_left:
-        default_qty_a = _suggest_column(list(df_a.columns), DEFAULT_QTY_COL)
-        qty_col_a = st.selectbox('Quantity column in Sheet A', options=list(df_a.columns), 
-                                index=(list(df_a.columns).index(default_qty_a) if default_qty_a in df_a.columns else 0), 
-                                key='qty_a')
+        if df_a is not None:
+            default_qty_a = _suggest_column(list(df_a.columns), DEFAULT_QTY_COL)
+            qty_col_a = st.selectbox('Quantity column in Sheet A', options=list(df_a.columns), 
+                                    index=(list(df_a.columns).index(default_qty_a) if default_qty_a in df_a.columns else 0), 
+                                    key='qty_a')
     with col_right:
         default_qty_b = _suggest_column(list(df_b.columns), DEFAULT_QTY_COL)
         qty_col_b = st.selectbox('Quantity column in Sheet B', options=list(df_b.columns), 
@@ -151,70 +179,72 @@ def catalog_qc():
     # Price column selection
     st.markdown('### Select price columns to compare')
     with col_left:
-        default_a = _suggest_price_column(list(df_a.columns))
-        price_col_a = st.selectbox('Price column in Sheet A', options=list(df_a.columns), index=(list(df_a.columns).index(default_a) if default_a in df_a.columns else 0), key='price_a')
+        if df_a is not None:
+            default_a = _suggest_price_column(list(df_a.columns))
+            price_col_a = st.selectbox('Price column in Sheet A', options=list(df_a.columns), index=(list(df_a.columns).index(default_a) if default_a in df_a.columns else 0), key='price_a')
     with col_right:
         default_b = _suggest_price_column(list(df_b.columns))
         price_col_b = st.selectbox('Price column in Sheet B', options=list(df_b.columns), index=(list(df_b.columns).index(default_b) if default_b in df_b.columns else 0), key='price_b')
 
-    # Build keys
-    df_a['_QC_KEY'] = _build_product_key(df_a, sku_col_a, qty_col_a)
-    df_b['_QC_KEY'] = _build_product_key(df_b, sku_col_b, qty_col_b)
-
-    # Coerce price columns to numeric
-    df_a['_QC_PRICE'] = pd.to_numeric(df_a[price_col_a], errors='coerce')
-    df_b['_QC_PRICE'] = pd.to_numeric(df_b[price_col_b], errors='coerce')
-
-    # Prepare subset for merge
-    subset_a = df_a[['_QC_KEY', '_QC_PRICE']].rename(columns={'_QC_PRICE': 'Price A'})
-    subset_b = df_b[['_QC_KEY', '_QC_PRICE']].rename(columns={'_QC_PRICE': 'Price B'})
-
-    merged = pd.merge(subset_a, subset_b, on='_QC_KEY', how='outer')
-
-    # Determine status
-    def status_row(row):
-        a = row.get('Price A')
-        b = row.get('Price B')
-        if pd.isna(a) or pd.isna(b):
-            return 'MISSING'
-        # Compare with 2-decimal rounding for stability
-        return 'MATCH' if round(float(a), 2) == round(float(b), 2) else 'MISMATCH'
-
-    merged['QC Status'] = merged.apply(status_row, axis=1)
-
-    # Split key back to columns for readability
-    display_keys = [sku_col_a, qty_col_a]
-    
-    def split_key(s: str) -> list[str]:
-        parts = s.split(' | ')
-        # pad/truncate
-        if len(parts) < len(display_keys):
-            parts += [''] * (len(display_keys) - len(parts))
-        return parts[:len(display_keys)]
-
-    keys_df = merged['_QC_KEY'].apply(split_key).apply(pd.Series)
-    
-    # Ensure unique column names to avoid styling conflicts
-    unique_display_keys = []
-    for i, key in enumerate(display_keys):
-        if key in unique_display_keys:
-            # If duplicate, add suffix
-            unique_display_keys.append(f"{key}_{i}")
-        else:
-            unique_display_keys.append(key)
-    
-    keys_df.columns = unique_display_keys
-
-    qc_df = pd.concat([keys_df, merged[['Price A', 'Price B', 'QC Status']]], axis=1)
+    # Comparison options
+    st.markdown('### Comparison options')
+    opt_left, opt_right = st.columns(2)
+    with opt_left:
+        tolerance = st.number_input('Price tolerance', min_value=0.0, value=0.0, step=0.01, format='%.2f',
+                                    help='Prices within this difference (after rounding to 2 decimals) count as MATCH',
+                                    key='qc_tolerance')
+    with opt_right:
+        duplicate_policy = st.selectbox('Duplicate SKU/quantity keys', options=DUPLICATE_POLICIES,
+                                        format_func=lambda p: 'Reject' if p == 'reject' else f'Aggregate ({p} price)',
+                                        help='Duplicate keys would otherwise multiply rows in the join',
+                                        key='qc_duplicates')
+
+    if use_reference:
+        include_reference_only = st.checkbox('Report reference keys missing from Sheet B', value=True,
+                                             key='qc_reference_only')
+
+    def compare():
+        with measure('qc_compare') as perf:
+            if use_reference:
+                result = compare_with_reference(reference_name, df_b, sku_col_b, qty_col_b, price_col_b,
+                                                tolerance=tolerance, duplicates=duplicate_policy,
+                                                include_reference_only=include_reference_only)
+            else:
+                result = compare_catalogs(df_a, df_b, sku_col_a, qty_col_a, price_col_a,
+                                          sku_col_b, qty_col_b, price_col_b,
+                                          tolerance=tolerance, duplicates=duplicate_policy)
+            observe(perf, result[0])
+        return result
+
+    # A saved reference is identified by name and save time, so replacing it invalidates the entry
+    if use_reference:
+        sheet_a = ('reference', reference_name, reference_saved_at, include_reference_only)
+    else:
+        sheet_a = (upload_hash(file_a), is_parquet(file_a), sheet_name_a, sku_col_a, qty_col_a, price_col_a)
+    sheet_b = (upload_hash(file_b), is_parquet(file_b), sheet_name_b, sku_col_b, qty_col_b, price_col_b)
+    qc_key = ('qc', sheet_a, sheet_b, tolerance, duplicate_policy)
+    try:
+        qc_df, duplicates = run_in_background('qc', qc_key, lambda: cache.get_or_compute(qc_key, compare),
+                                              'Comparing catalogs', ['qc_compare'])
+    except DuplicateKeyError as e:
+        st.error(f'{e}. Choose an aggregation for duplicate keys or fix the sheets.')
+        _show_duplicates(e.duplicates)
+        return
+    if any(len(dups) for dups in duplicates.values()):
+        st.warning(f"Duplicate keys were aggregated using the {duplicate_policy} price.")
+        _show_duplicates(duplicates)
 
     st.subheader('QC Preview')
-    st.dataframe(_styled_preview(qc_df), use_container_width=True)
+    row_css = qc_df['QC Status'].map(STATUS_CSS).fillna('').to_numpy()
+    paginated_preview(qc_df, 'qc_preview', lambda page, rows: _styled_preview(page, row_css[rows]))
 
     # Downloads
-    excel_buffer = _excel_with_colors(qc_df)
     st.download_button(
         '📥 Download QC Report (Excel, colored)',
-        excel_buffer,
+        lazy_download(qc_df, _excel_with_colors),
         file_name='Catalog_QC_Report.xlsx',
         mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
+
+    if df_a is not None:
+        _save_reference_form(df_a, sku_col_a, qty_col_a, price_col_a, duplicate_policy, references)
@@ -0,0 +1,227 @@
+"""Headless bidding -> catalog -> QC pipeline.
+
+    python cli.py bidding suppliers/ --markup 35 --out out/
+    python cli.py catalog "out/Bidding Sheet.csv" --out out/
+    python cli.py qc master.csv "out/Catalog Sheet.csv" --out out/
+    python cli.py run suppliers/*.csv --markup 35 --qc-against "Master catalog" --out out/
+
+Exit codes: 0 success, 1 QC found mismatches (or missing keys with --fail-on-missing),
+2 bad arguments, unusable input or an unexpected error.
+"""
+import argparse
+import glob
+import os
+import sys
+import traceback
+
+import pandas as pd
+
+from bidding_core import apply_markup
+from catalog_core import build_catalog_sheet, read_bidding_sheet
+from excel_export import bidding_sheet_xlsx, partner_quotes_csv_bytes, partner_quotes_parquet_bytes, qc_report_xlsx, to_csv_bytes, to_parquet_bytes
+from ingestion import clean_frame, read_table
+from instrumentation import enable_logging, measure, observe
+from normalization import Normalizer
+from partitioned import AGGREGATION_WORKERS, load_bids_out_of_core
+from pipeline import load_bids, rank_bids
+from qc_core import DUPLICATE_POLICIES, DuplicateKeyError, compare_catalogs
+from reference_store import compare_with_reference, list_references
+
+EXIT_OK = 0
+EXIT_QC_FAILED = 1
+EXIT_INPUT_ERROR = 2
+
+DEFAULT_SKU_COL = 'Dandpo SKU'
+DEFAULT_QTY_COL = 'Quantity'
+
+
+class InputError(Exception):
+    pass
+
+
+def expand_inputs(patterns: list[str], extensions=('.csv', '.xlsx', '.xlsm')) -> list[str]:
+    """Directories expand to their files with a matching extension; other arguments are globs."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                       if name.lower().endswith(extensions)]
+        else:
+            matches = glob.glob(pattern)
+        paths.extend(sorted(matches))
+    if not paths:
+        raise InputError(f"No input files matched: {' '.join(patterns)}")
+    return paths
+
+
+def _write(data, out_dir: str, file_name: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, file_name)
+    if hasattr(data, 'getvalue'):
+        data = data.getvalue()
+    with open(path, 'wb') as f:
+        f.write(data)
+    print(f'wrote {path}')
+    return path
+
+
+def _price_column(columns) -> str:
+    # Prefer columns containing 'Customer Price' then 'Price'
+    for pref in ['Customer Price', 'Price']:
+        for col in columns:
+            if pref.lower() in col.lower():
+                return col
+    raise InputError('No price column found; pass --price-col')
+
+
+def build_bidding(inputs: list[str], markup: float, out_dir: str, long_quotes: bool = False,
+                  normalize: bool = False, memory_mb: float | None = None,
+                  workers: int = AGGREGATION_WORKERS) -> pd.DataFrame:
+    normalizer = Normalizer() if normalize else None
+    if memory_mb is not None:
+        bids_df, errors = load_bids_out_of_core(expand_inputs(inputs), memory_mb, normalizer)
+    else:
+        bids_df, errors = load_bids(expand_inputs(inputs), normalizer=normalizer, workers=workers)
+    for name, error in errors:
+        print(f'skipped {name}: {error}', file=sys.stderr)
+    if normalizer is not None:
+        stats = normalizer.stats
+        print(f"normalized {stats['distinct']} distinct spellings: {stats['cached']} cached, "
+              f"{stats['requested']} sent in {stats['requests']} request(s), {stats['failed']} failed", file=sys.stderr)
+    if bids_df is None:
+        raise InputError('No usable supplier files')
+    bidding_df = apply_markup(rank_bids(bids_df), markup)
+    _write(to_csv_bytes(bidding_df), out_dir, 'Bidding Sheet.csv')
+    _write(bidding_sheet_xlsx(bidding_df), out_dir, 'Bidding Sheet.xlsx')
+    _write(to_parquet_bytes(bidding_df), out_dir, 'Bidding Sheet.parquet')
+    if long_quotes:
+        _write(partner_quotes_csv_bytes(bidding_df), out_dir, 'Bidding Quotes.csv')
+        _write(partner_quotes_parquet_bytes(bidding_df), out_dir, 'Bidding Quotes.parquet')
+    return bidding_df
+
+
+def build_catalog(bidding_df: pd.DataFrame, markup: float, out_dir: str) -> pd.DataFrame:
+    with measure('catalog_transform') as perf:
+        catalog_df = build_catalog_sheet(bidding_df, markup)
+        observe(perf, catalog_df)
+    _write(to_csv_bytes(catalog_df), out_dir, 'Catalog Sheet.csv')
+    return catalog_df
+
+
+def run_qc(candidate_df: pd.DataFrame, against: str, args) -> int:
+    """QC the candidate (Sheet B) against a CSV path or a saved reference name (Sheet A)."""
+    sku_col = args.sku_col
+    qty_col = args.qty_col
+    price_col_b = args.price_col or _price_column(candidate_df.columns)
+    try:
+        if os.path.exists(against):
+            reference_df = clean_frame(read_table(against), numeric_columns=['Quantity'])
+            price_col_a = args.price_col or _price_column(reference_df.columns)
+            with measure('qc_compare') as perf:
+                qc_df, _ = compare_catalogs(reference_df, candidate_df, sku_col, qty_col, price_col_a,
+                                            sku_col, qty_col, price_col_b,
+                                            tolerance=args.tolerance, duplicates=args.duplicates)
+                observe(perf, qc_df)
+        elif against in set(list_references()['name']):
+            with measure('qc_compare') as perf:
+                qc_df, _ = compare_with_reference(against, candidate_df, sku_col, qty_col, price_col_b,
+                                                  tolerance=args.tolerance, duplicates=args.duplicates)
+                observe(perf, qc_df)
+        else:
+            raise InputError(f'{against!r} is neither a file nor a saved reference catalog')
+    except (DuplicateKeyError, KeyError) as e:
+        raise InputError(str(e)) from e
+
+    _write(qc_report_xlsx(qc_df), args.out, 'Catalog_QC_Report.xlsx')
+    counts = qc_df['QC Status'].value_counts()
+    print('QC: ' + ', '.join(f'{status} {counts.get(status, 0)}' for status in ['MATCH', 'MISMATCH', 'MISSING']))
+    failed = counts.get('MISMATCH', 0) or (args.fail_on_missing and counts.get('MISSING', 0))
+    return EXIT_QC_FAILED if failed else EXIT_OK
+
+
+def _add_qc_options(parser: argparse.ArgumentParser):
+    parser.add_argument('--sku-col', default=DEFAULT_SKU_COL, help='SKU column in both sheets')
+    parser.add_argument('--qty-col', default=DEFAULT_QTY_COL, help='Quantity column in both sheets')
+    parser.add_argument('--price-col', help="Price column in both sheets (default: first 'Customer Price'/'Price' column)")
+    parser.add_argument('--tolerance', type=float, default=0.0, help='Price difference still counted as MATCH')
+    parser.add_argument('--duplicates', choices=DUPLICATE_POLICIES, default='reject',
+                        help='Reject duplicate SKU/quantity keys or aggregate them')
+    parser.add_argument('--fail-on-missing', action='store_true', help='Also exit non-zero on MISSING keys')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Build bidding sheets, catalog sheets and QC reports without the UI.')
+    parser.add_argument('--perf', action='store_true', help='Log timing and memory of each stage to stderr as JSON lines')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    bidding = sub.add_parser('bidding', help='Aggregate supplier cost sheets into a bidding sheet')
+    bidding.add_argument('inputs', nargs='+', help='Supplier CSV/Excel files, directories or globs')
+    bidding.add_argument('--markup', type=float, default=35.0, help='Customer price markup (%%)')
+
+    catalog = sub.add_parser('catalog', help='Convert a bidding sheet into a catalog sheet')
+    catalog.add_argument('bidding_sheet', help='Bidding sheet CSV, Excel or Parquet')
+    catalog.add_argument('--markup', type=float, default=0.0, help='Recalculate customer prices at this markup (%%); 0 keeps them')
+
+    qc = sub.add_parser('qc', help='Compare a sheet against a reference sheet or saved reference catalog')
+    qc.add_argument('against', help='Sheet A: CSV/Excel/Parquet path or saved reference catalog name')
+    qc.add_argument('candidate', help='Sheet B: CSV/Excel/Parquet path')
+    _add_qc_options(qc)
+
+    run = sub.add_parser('run', help='Run bidding -> catalog (-> QC) in one go')
+    run.add_argument('inputs', nargs='+', help='Supplier CSV/Excel files, directories or globs')
+    run.add_argument('--markup', type=float, default=35.0, help='Customer price markup (%%)')
+    run.add_argument('--catalog-markup', type=float, default=0.0, help='Recalculate catalog prices at this markup (%%)')
+    run.add_argument('--qc-against', help='QC the catalog against this CSV/Excel/Parquet path or saved reference catalog')
+    _add_qc_options(run)
+
+    for command in (bidding, run):
+        command.add_argument('--long-quotes', action='store_true',
+                             help="Also write 'Bidding Quotes' (CSV and Parquet): one row per product and quoting partner")
+        command.add_argument('--normalize', action='store_true',
+                             help='Map spelling variants of Combinations and Printer Specifications to one canonical '
+                                  'spelling with the language model (needs openai and OPENAI_API_KEY)')
+        command.add_argument('--memory-mb', type=float,
+                             help='Aggregate out of core, spilling supplier rows to disk, within about this much '
+                                  'memory (MB); for rounds larger than RAM')
+        command.add_argument('--workers', type=int, default=AGGREGATION_WORKERS,
+                             help='Processes that aggregate large rounds in parallel, by product key '
+                                  '(default: PRICINGAI_AGGREGATION_WORKERS or the CPU count; 1 runs serially)')
+    for command in (bidding, catalog, qc, run):
+        command.add_argument('--out', default='.', help='Output directory')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.perf:
+        enable_logging()
+    try:
+        if args.command == 'bidding':
+            build_bidding(args.inputs, args.markup, args.out, args.long_quotes, args.normalize, args.memory_mb,
+                          args.workers)
+        elif args.command == 'catalog':
+            build_catalog(read_bidding_sheet(args.bidding_sheet), args.markup, args.out)
+        elif args.command == 'qc':
+            candidate_df = clean_frame(read_table(args.candidate), numeric_columns=['Quantity'])
+            return run_qc(candidate_df, args.against, args)
+        elif args.command == 'run':
+            bidding_df = build_bidding(args.inputs, args.markup, args.out, args.long_quotes, args.normalize,
+                                       args.memory_mb, args.workers)
+            catalog_df = build_catalog(bidding_df, args.catalog_markup, args.out)
+            if args.qc_against:
+                return run_qc(catalog_df, args.qc_against, args)
+    except (InputError, OSError, ValueError, RuntimeError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return EXIT_INPUT_ERROR
+    except KeyError as e:
+        print(f'error: missing column {e}', file=sys.stderr)
+        return EXIT_INPUT_ERROR
+    except Exception:
+        # Exit code 1 is reserved for QC failures, so a crash must not end with it
+        traceback.print_exc()
+        return EXIT_INPUT_ERROR
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
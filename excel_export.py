@@ -0,0 +1,184 @@
+import io
+import json
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import PatternFill
+from openpyxl.utils import get_column_letter
+
+from bidding_core import CHUNK_ROWS, partner_quotes, ranking_columns, to_wide
+from ingestion import PARQUET_METADATA_KEY
+from instrumentation import measure, observe
+
+GREEN = '90EE90'
+RED = 'FF7F7F'
+YELLOW = 'FFF59D'
+
+# Serialized downloads per result table, keyed by id() and dropped when the table is collected
+_exports: dict[int, dict[str, bytes]] = {}
+_exports_lock = threading.Lock()
+
+
+def _fill(color: str) -> PatternFill:
+    return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+
+def _column_ref(df: pd.DataFrame, column: str) -> str:
+    # Column-absolute, row-relative reference to the first data row
+    return f'${get_column_letter(df.columns.get_loc(column) + 1)}2'
+
+
+def matching_price_rule(df: pd.DataFrame, column: str, color: str = GREEN) -> tuple[str, str]:
+    """Highlight every numeric cell equal (to 2 decimals) to the row's value in `column`."""
+    ref = _column_ref(df, column)
+    return f'AND(ISNUMBER(A2),ISNUMBER({ref}),ROUND(A2,2)=ROUND({ref},2))', color
+
+
+def status_rules(df: pd.DataFrame, column: str, colors: dict[str, str]) -> list[tuple[str, str]]:
+    """Highlight whole rows by the text value in `column`."""
+    ref = _column_ref(df, column)
+    return [(f'{ref}="{status}"', color) for status, color in colors.items()]
+
+
+def _data_ranges(df: pd.DataFrame, skip_columns) -> str:
+    # Space-separated ranges over the runs of columns not skipped; the first column is kept,
+    # so rule formulas stay relative to A2
+    kept = ~df.columns.isin(list(skip_columns))
+    kept[0] = True
+    ranges, start = [], None
+    for i, keep in enumerate(list(kept) + [False]):
+        if keep and start is None:
+            start = i
+        elif not keep and start is not None:
+            ranges.append(f'{get_column_letter(start + 1)}2:{get_column_letter(i)}{len(df) + 1}')
+            start = None
+    return ' '.join(ranges)
+
+
+def dataframe_to_xlsx(df: pd.DataFrame, sheet_title: str, rules=(), skip_columns=()) -> io.BytesIO:
+    """Stream a frame into a write-only workbook, highlighting via conditional formatting.
+
+    `rules` are (formula, color) pairs written relative to cell A2 and applied to the whole
+    data range but `skip_columns`, so the file carries one rule per color instead of one fill
+    per cell.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_title)
+    ws.append([str(col) for col in df.columns])
+    # Plain Python values with None for gaps, so missing cells stay empty; a sparse partner
+    # matrix is made wide one block of rows at a time
+    for start in range(0, len(df), CHUNK_ROWS):
+        block = to_wide(df.iloc[start:start + CHUNK_ROWS])
+        values = block.astype(object).where(block.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+
+    if len(df) and len(df.columns):
+        data_range = _data_ranges(df, skip_columns)
+        for formula, color in rules:
+            ws.conditional_formatting.add(data_range, FormulaRule(formula=[formula], fill=_fill(color)))
+
+    bio = io.BytesIO()
+    wb.save(bio)
+    bio.seek(0)
+    return bio
+
+
+def bidding_sheet_xlsx(df: pd.DataFrame) -> io.BytesIO:
+    # A runner-up tied with the winner is not the selected price
+    return dataframe_to_xlsx(df, 'Bidding Sheet', [matching_price_rule(df, 'Bid Selected Price', GREEN)],
+                             skip_columns=ranking_columns())
+
+
+def qc_report_xlsx(qc_df: pd.DataFrame) -> io.BytesIO:
+    # Apply row color by status
+    rules = status_rules(qc_df, 'QC Status', {'MATCH': GREEN, 'MISMATCH': RED, 'MISSING': YELLOW})
+    return dataframe_to_xlsx(qc_df, 'Catalog QC', rules)
+
+
+def _whole_numbers(series: pd.Series) -> bool:
+    # Only the stored values of a sparse column need checking
+    values = series.sparse.sp_values if isinstance(series.dtype, pd.SparseDtype) else series.to_numpy()
+    values = values[~np.isnan(values)]
+    return bool(np.all((values % 1 == 0) & (np.abs(values) < 2**53)))
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """CSV of the table, one block of rows at a time.
+
+    Float columns holding only whole numbers are written as integers (24, not 24.0), the way
+    the supplier sheets had them.
+    """
+    whole = [col for col in df.columns if pd.api.types.is_float_dtype(df[col].dtype) and _whole_numbers(df[col])]
+    blocks = []
+    for start in range(0, max(len(df), 1), CHUNK_ROWS):
+        block = df.iloc[start:start + CHUNK_ROWS].copy()
+        for col in whole:
+            block[col] = pd.Series(block[col].to_numpy(dtype=float, na_value=np.nan), index=block.index).astype('Int64')
+        blocks.append(block.to_csv(index=False, header=not blocks))
+    return ''.join(blocks).encode("utf-8")
+
+
+def partner_quotes_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Long layout of the bid table: one row per product key and quoting partner."""
+    return to_csv_bytes(partner_quotes(df))
+
+
+def partner_quotes_parquet_bytes(df: pd.DataFrame) -> bytes:
+    return to_parquet_bytes(partner_quotes(df))
+
+
+def to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    """Parquet with the table's dtypes and its attrs (markup, partner columns) in the schema metadata.
+
+    A sparse partner matrix is written wide, one row group per block of rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    writer = None
+    for start in range(0, max(len(df), 1), CHUNK_ROWS):
+        block = to_wide(df.iloc[start:start + CHUNK_ROWS])
+        if writer is None:
+            table = pa.Table.from_pandas(block, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[PARQUET_METADATA_KEY] = json.dumps(df.attrs).encode('utf-8')
+            schema = table.schema.with_metadata(metadata)
+            writer = pq.ParquetWriter(buffer, schema, compression='zstd')
+        else:
+            table = pa.Table.from_pandas(block, schema=schema, preserve_index=False)
+        writer.write_table(table.replace_schema_metadata(metadata))
+    writer.close()
+    return buffer.getvalue()
+
+
+def lazy_download(df: pd.DataFrame, build):
+    """Zero-argument callable for st.download_button's `data`.
+
+    The file is built on the first click only and memoized on the identity of `df`, so an
+    unchanged result table is never serialized twice.
+    """
+    kind = getattr(build, '__qualname__', repr(build))
+    key = id(df)
+
+    def produce() -> bytes:
+        with _exports_lock:
+            data = _exports.get(key, {}).get(kind)
+        if data is None:
+            with measure(f'export {kind}') as perf:
+                observe(perf, df)
+                data = build(df)
+            if isinstance(data, io.BytesIO):
+                data = data.getvalue()
+            with _exports_lock:
+                if key not in _exports:
+                    _exports[key] = {}
+                    weakref.finalize(df, _exports.pop, key, None)
+                _exports[key][kind] = data
+        return data
+
+    return produce
@@ -0,0 +1,280 @@
+import hashlib
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from bidding_core import REQUIRED_COLUMNS, validate_header
+
+try:
+    import pyarrow  # noqa: F401 - only needed for the faster CSV engine
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+try:
+    import python_calamine  # noqa: F401 - only needed for the faster Excel engine
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'  # pandas opens workbooks read-only: cell values, no styles or formulas
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Schema metadata key holding a table's DataFrame.attrs in Parquet files
+PARQUET_METADATA_KEY = b'pricingai.attrs'
+
+# Upper bound for parallel file parsing; the pyarrow engine also threads within a file
+MAX_INGEST_WORKERS = 8
+
+# Declared dtypes for supplier cost sheets
+SUPPLIER_SCHEMA = {
+    'Category': 'category',
+    'Dandpo SKU': 'string',
+    'Combinations': 'category',
+    'Printer Specifications': 'category',
+    'Quantity': 'float64',
+    'Sample': 'category',
+    'Printer Cost': 'float64',
+    'Lead Time': 'float64',
+    'Weight in kg': 'float64',
+    'Partner Name': 'category',
+}
+
+SUPPLIER_NUMERIC_COLUMNS = [col for col, dtype in SUPPLIER_SCHEMA.items() if dtype not in ('category', 'string')]
+
+
+def _buffer(source):
+    # Uploaded files are read twice (header, then body), so work from their bytes
+    if hasattr(source, 'getvalue'):
+        return io.BytesIO(source.getvalue())
+    return source
+
+
+def read_header(source) -> list[str]:
+    return list(pd.read_csv(_buffer(source), nrows=0).columns)
+
+
+def _fill_text(series: pd.Series) -> pd.Series:
+    # Missing text becomes '' without falling back to object dtype
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if '' not in series.cat.categories:
+            series = series.cat.add_categories([''])
+        return series.fillna('')
+    if pd.api.types.is_string_dtype(series.dtype) or series.dtype == object:
+        return series.fillna('')
+    return series
+
+
+def _to_number(series: pd.Series, dtype=None) -> pd.Series:
+    series = pd.to_numeric(series, errors='coerce').fillna(0)
+    return series.astype(dtype) if dtype is not None else series
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    df = df.dropna(how='all')  # Remove completely empty rows
+    columns = {}
+    for col in df.columns:
+        dtype = schema.get(col)
+        if dtype in ('category', 'string'):
+            columns[col] = _fill_text(df[col].astype(dtype))
+        elif dtype is not None:
+            columns[col] = _to_number(df[col], dtype)
+        else:
+            columns[col] = _fill_text(df[col])
+    return pd.DataFrame(columns, index=df.index)
+
+
+def clean_frame(df: pd.DataFrame, numeric_columns=()) -> pd.DataFrame:
+    """Drop empty rows, coerce the given columns to numbers and fill missing text with ''."""
+    df = df.dropna(how='all')
+    columns = {}
+    for col in df.columns:
+        if col in numeric_columns:
+            columns[col] = _to_number(df[col])
+        else:
+            columns[col] = _fill_text(df[col])
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _read_supplier_workbook(source, filename) -> pd.DataFrame:
+    # Workbooks are parsed a whole sheet at a time, so the header is checked on the parsed sheet;
+    # the cost sheet is the first worksheet with every required column
+    error = None
+    for sheet in excel_sheet_names(source):
+        df = read_excel(source, sheet, usecols=lambda col: col in REQUIRED_COLUMNS)
+        try:
+            validate_header(df.columns, f'{filename} (worksheet {sheet!r})')
+            return df
+        except ValueError as e:
+            error = error or e
+    raise error or ValueError(f'File {filename} has no worksheets')
+
+
+def _read_csv_arrow(source, usecols: list[str], text: list[str]) -> pd.DataFrame:
+    # pandas' pyarrow engine applies dtype= as a cast after inference, which drops leading zeros
+    # and fails on integer columns with blanks; pyarrow itself can be told the column types
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    options = pa_csv.ConvertOptions(include_columns=usecols, column_types={col: pa.string() for col in text},
+                                    strings_can_be_null=True)
+    return pa_csv.read_csv(_buffer(source), convert_options=options).to_pandas()
+
+
+def read_supplier_sheet(source, filename=None) -> pd.DataFrame:
+    """Read a supplier cost sheet with the declared schema, parsing only the required columns."""
+    if is_excel(source):
+        df = _read_supplier_workbook(source, filename or getattr(source, 'name', source))
+        return apply_schema(df, SUPPLIER_SCHEMA)
+    header = read_header(source)
+    # Reject bad files on their header before paying for the body
+    validate_header(header, filename or getattr(source, 'name', source))
+    usecols = [col for col in header if col in REQUIRED_COLUMNS]
+    # Text columns parse as text, so SKU 007 stays 007; numbers are inferred (blank cells as NaN,
+    # stray text as text) and coerced leniently by apply_schema
+    text = [col for col in usecols if col not in SUPPLIER_NUMERIC_COLUMNS]
+    if CSV_ENGINE == 'pyarrow':
+        df = _read_csv_arrow(source, usecols, text)
+    else:
+        df = pd.read_csv(_buffer(source), usecols=usecols, dtype={col: SUPPLIER_SCHEMA[col] for col in text})
+    return apply_schema(df, SUPPLIER_SCHEMA)
+
+
+def file_hash(source) -> str:
+    if hasattr(source, 'getvalue'):
+        return hashlib.sha256(source.getvalue()).hexdigest()
+    with open(source, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_one(source, cache=None, hashed=False):
+    name = getattr(source, 'name', str(source))
+    content_hash = None
+    try:
+        if hashed or (cache is not None and hasattr(source, 'getvalue')):
+            content_hash = file_hash(source)
+        if cache is not None and hasattr(source, 'getvalue'):
+            # Parsed frames are shared by content, whatever the file is called
+            df = cache.get_or_compute(('supplier_sheet', content_hash), lambda: read_supplier_sheet(source, name))
+        else:
+            df = read_supplier_sheet(source, name)
+        return name, content_hash, df, None
+    except Exception as e:
+        return name, content_hash, None, str(e)
+
+
+def load_supplier_results(sources, max_workers=MAX_INGEST_WORKERS, cache=None, hashed=True):
+    """Parse supplier sheets on a thread pool, reusing frames from `cache` for uploads seen before.
+
+    Returns one (file name, content hash, frame or None, error or None) per source, in upload
+    order. Without `hashed`, the hash is only computed when the cache needs it.
+    """
+    sources = list(sources)
+    workers = max(1, min(max_workers, len(sources)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda source: _load_one(source, cache, hashed), sources))
+
+
+def load_supplier_files(sources, max_workers=MAX_INGEST_WORKERS, cache=None):
+    """load_supplier_results, split into results and failures.
+
+    Returns the (file name, frame) of every valid file and a list of (file name, error) for
+    every file that failed, both in upload order.
+    """
+    results = load_supplier_results(sources, max_workers, cache, hashed=False)
+    frames = [(name, df) for name, _, df, error in results if error is None]
+    errors = [(name, error) for name, _, df, error in results if error is not None]
+    return frames, errors
+
+
+def read_csv(source) -> pd.DataFrame:
+    return pd.read_csv(_buffer(source), engine=CSV_ENGINE)
+
+
+def is_parquet(source) -> bool:
+    return str(getattr(source, 'name', source)).lower().endswith('.parquet')
+
+
+def read_parquet(source) -> pd.DataFrame:
+    """Read a Parquet sheet with its stored dtypes and restore its attrs from the schema metadata."""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(_buffer(source))
+    df = table.to_pandas()
+    attrs = (table.schema.metadata or {}).get(PARQUET_METADATA_KEY)
+    if attrs:
+        df.attrs.update(json.loads(attrs))
+    return df
+
+
+def is_excel(source) -> bool:
+    return str(getattr(source, 'name', source)).lower().endswith(EXCEL_EXTENSIONS)
+
+
+def excel_sheet_names(source) -> list[str]:
+    with pd.ExcelFile(_buffer(source), engine=EXCEL_ENGINE) as workbook:
+        return workbook.sheet_names
+
+
+def read_excel(source, sheet_name: str | int | None = None, **kwargs) -> pd.DataFrame:
+    """Read one worksheet (the first by default); formulas come in as their last computed values."""
+    return pd.read_excel(_buffer(source), sheet_name=0 if sheet_name is None else sheet_name,
+                         engine=EXCEL_ENGINE, **kwargs)
+
+
+def read_table(source, sheet_name: str | None = None) -> pd.DataFrame:
+    """Read a CSV, Parquet or Excel sheet; `sheet_name` picks the worksheet of a workbook."""
+    if is_parquet(source):
+        return read_parquet(source)
+    if is_excel(source):
+        return read_excel(source, sheet_name)
+    return read_csv(source)
+
+
+def read_csv_sheet(source, numeric_columns=()) -> pd.DataFrame:
+    """Read a CSV sheet with the fast engine and the missing-value handling of clean_frame()."""
+    return clean_frame(read_csv(source), numeric_columns)
+
+
+def concat_dtypes(frame_dtypes: list[dict]) -> dict:
+    """Categorical dtypes concat_frames gives frames with these per-column dtypes.
+
+    A column keeps its dtype when every frame agrees and gets the sorted union of the
+    categories otherwise; non-categorical columns are left out.
+    """
+    dtypes = {}
+    for col, dtype in frame_dtypes[0].items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            if any(other[col] != dtype for other in frame_dtypes[1:]):
+                categories = dtype.categories
+                for other in frame_dtypes[1:]:
+                    categories = categories.union(other[col].categories)
+                dtype = pd.CategoricalDtype(categories.sort_values())
+            dtypes[col] = dtype
+    return dtypes
+
+
+def with_categories(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """`df` with the given categorical dtypes, categories in their order.
+
+    astype() leaves a column alone when it already has the same categories in another order.
+    """
+    columns = {}
+    for col, dtype in dtypes.items():
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            columns[col] = df[col].cat.set_categories(dtype.categories)
+        else:
+            columns[col] = df[col].astype(dtype)
+    return df.assign(**columns)
+
+
+def concat_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate typed frames, keeping categoricals categorical across differing categories."""
+    combined = pd.concat(frames, ignore_index=True)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype) and not isinstance(combined[col].dtype, pd.CategoricalDtype):
+            parts = [frame[col] for frame in frames if col in frame.columns]
+            if len(parts) == len(frames):
+                combined[col] = pd.Series(union_categoricals(parts, sort_categories=True), index=combined.index)
+    return combined
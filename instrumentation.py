@@ -0,0 +1,96 @@
+import contextvars
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('pricingai.perf')
+
+# Records of the current collect() block (one Streamlit tab run, one CLI command)
+_collector = contextvars.ContextVar('perf_collector', default=None)
+# Called with each stage's name as it starts; background jobs report progress and cancel through it
+_stage_listener = contextvars.ContextVar('stage_listener', default=None)
+
+
+def enable_logging(stream=None):
+    """Emit one JSON log line per measured stage."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _memory_mb() -> dict[str, float | None]:
+    # Current resident set size and the process high-water mark; cheap enough for every stage
+    rss = peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except (OSError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # bytes on macOS, KiB elsewhere
+    if rss is not None and peak is not None:
+        peak = max(peak, rss)  # the high-water mark is sampled less precisely than statm
+    return {'rss_mb': rss and round(rss, 1), 'peak_rss_mb': peak and round(peak, 1)}
+
+
+def observe(record: dict, df) -> None:
+    """Attach the row and column count of a stage's output (or input) table."""
+    record['rows'], record['cols'] = df.shape if df is not None else (None, None)
+
+
+@contextmanager
+def measure(stage: str):
+    """Time a stage and record its memory; yields the record so the caller can `observe` a table."""
+    listener = _stage_listener.get()
+    if listener is not None:
+        listener(stage)
+    collector = _collector.get()
+    record = {'tab': collector['tab'] if collector else None, 'stage': stage, 'rows': None, 'cols': None}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 4)
+        record.update(_memory_mb())
+        logger.info(json.dumps(record))
+        if collector:
+            collector['records'].append(record)
+
+
+@contextmanager
+def collect(tab: str):
+    """Gather the records of every stage measured inside the block."""
+    collector = {'tab': tab, 'records': []}
+    token = _collector.set(collector)
+    try:
+        yield collector['records']
+    finally:
+        _collector.reset(token)
+
+
+def add_records(records: list[dict]) -> None:
+    """Add records measured elsewhere (in a background job) to the current collect() block."""
+    collector = _collector.get()
+    if collector:
+        collector['records'].extend({**record, 'tab': collector['tab']} for record in records)
+
+
+@contextmanager
+def on_stage(listener):
+    """Call `listener(stage)` as each stage measured inside the block starts; it may raise to abort."""
+    token = _stage_listener.set(listener)
+    try:
+        yield
+    finally:
+        _stage_listener.reset(token)
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import collect, on_stage
+
+# Builds running at once across all sessions; further jobs wait in the queue
+JOB_WORKERS = int(os.environ.get('PRICINGAI_JOB_WORKERS', 4))
+# Finished jobs stay retrievable by id for this long
+JOB_RETENTION_SECONDS = float(os.environ.get('PRICINGAI_JOB_RETENTION_S', 900))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One background computation; its stages are measured and reported as they start."""
+
+    def __init__(self, key, tab: str | None, stages):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.tab = tab
+        self.stages = list(stages)  # expected stage names, for the progress estimate
+        self.status = QUEUED
+        self.stage = None
+        self.records = []  # measured stages, filled in as they finish
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self.watchers = set()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._result = self._error = None
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def progress(self) -> float:
+        """Share of the expected stages finished so far."""
+        if self.status == DONE:
+            return 1.0
+        if not self.stages:
+            return 0.0
+        finished = {record['stage'] for record in self.records} & set(self.stages)
+        return min(len(finished) / len(self.stages), 0.99)
+
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - (self.started or self.submitted)
+
+    def result(self):
+        """The computed value; raises the job's error, or JobCancelled."""
+        self._done.wait()
+        if self.status == CANCELLED:
+            raise JobCancelled(f'Job {self.id} was cancelled')
+        if self.status == FAILED:
+            raise self._error
+        return self._result
+
+    def _stage_started(self, stage: str):
+        # Cancellation is cooperative: it takes effect when the next stage starts
+        if self._cancel.is_set():
+            raise JobCancelled(f'Job {self.id} was cancelled')
+        self.stage = stage
+
+
+class JobManager:
+    """Thread pool for long builds, shared by every session; jobs are found by id or by key.
+
+    A job still queued, running or finished for the same key is shared rather than started
+    again, so a rerun or a second user with the same inputs attaches to the running build.
+    A job is cancelled once every session watching it has asked to cancel.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.retention = retention_seconds
+        self._jobs: dict[str, Job] = {}
+        self._by_key: dict = {}  # key -> id of the job computing it
+        self._lock = threading.Lock()
+
+    def submit(self, key, compute, tab: str | None = None, stages=(), watcher=None) -> Job:
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(self._by_key.get(key))
+            if job is None or job.cancel_requested or job.status in (FAILED, CANCELLED):
+                job = Job(key, tab, stages)
+                self._jobs[job.id] = job
+                self._by_key[key] = job.id
+                self._pool.submit(self._run, job, compute)
+            if watcher is not None:
+                job.watchers.add(watcher)
+            return job
+
+    def get(self, job_id: str | None) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str, watcher=None) -> bool:
+        """Stop watching a job, cancelling it when nobody else is; returns whether it was cancelled."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done():
+                return False
+            job.watchers.discard(watcher)
+            if job.watchers:
+                return False
+            job._cancel.set()
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+            return True
+
+    def _run(self, job: Job, compute):
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            with collect(job.tab) as records, on_stage(job._stage_started):
+                job.records = records
+                value = compute()
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job._error = e
+            self._finish(job, FAILED)
+        else:
+            job._result = value
+            self._finish(job, DONE)
+
+    def _finish(self, job: Job, status: str):
+        job.status, job.finished = status, time.time()
+        job._done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.done() and job.finished < cutoff:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) == job_id:
+                    del self._by_key[job.key]
+
+
+# Shared by every session of the app process
+jobs = JobManager()
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+from storage import data_path
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+NORMALIZATION_DB = 'normalization.sqlite'
+
+# Free-text key columns whose spelling variants split otherwise identical products
+NORMALIZE_COLUMNS = ['Combinations', 'Printer Specifications']
+
+NORMALIZE_MODEL = os.environ.get('PRICINGAI_NORMALIZE_MODEL', 'gpt-4o-mini')
+# Distinct strings per request, and requests in flight at once
+NORMALIZE_BATCH_SIZE = int(os.environ.get('PRICINGAI_NORMALIZE_BATCH', 100))
+NORMALIZE_CONCURRENCY = int(os.environ.get('PRICINGAI_NORMALIZE_CONCURRENCY', 4))
+# Canonical spellings already on file that a request asks the model to reuse
+MAX_KNOWN_VALUES = 200
+
+logger = logging.getLogger('pricingai.normalization')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mappings (
+    field TEXT NOT NULL,
+    raw TEXT NOT NULL,
+    folded TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    model TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    PRIMARY KEY (field, raw)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS mappings_by_folded ON mappings (field, folded);
+"""
+
+_PROMPT = (
+    'You normalize free-text values of the "{field}" attribute of print products. Map every input '
+    'value to one canonical spelling: values that name the same thing (case, spacing, punctuation, '
+    'abbreviations or extra words such as "Print") must map to the same string, values that differ '
+    'in meaning must not. When one of the existing canonical values fits, use it exactly.\n'
+    'Existing canonical values: {known}\n'
+    'Answer with a JSON object {{"mappings": {{"<input value>": "<canonical value>", ...}}}} that '
+    'covers every input value.'
+)
+
+
+def _connect(path: str | None = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or data_path(NORMALIZATION_DB), timeout=60)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def fold(value: str) -> str:
+    """Spelling-insensitive form: case, runs of spaces and spaces around punctuation ignored.
+
+    Values with the same folded form are variants of each other without asking the model.
+    """
+    value = re.sub(r'\s+', ' ', value.casefold()).strip()
+    return re.sub(r'\s*([,/;:+&()-])\s*', r'\1', value)
+
+
+class OpenAIClient:
+    """Maps batches of distinct values to canonical spellings with the chat completions API.
+
+    `client` is anything shaped like openai.OpenAI (a `chat.completions.create` method); by
+    default one is built from the environment, so OPENAI_BASE_URL can point at a local server.
+    Any object with the same `normalize(field, values, known)` method can stand in for this
+    class as the Normalizer's client, e.g. StubClient.
+    """
+
+    def __init__(self, client=None, model: str = NORMALIZE_MODEL):
+        if client is None:
+            if openai is None:
+                raise RuntimeError('Normalization needs the openai package (pip install openai)')
+            try:
+                client = openai.OpenAI()
+            except openai.OpenAIError as e:
+                raise RuntimeError(f'Normalization needs an OpenAI client: {e}') from e
+        self.client = client
+        self.model = model
+
+    def normalize(self, field: str, values: list[str], known: list[str]) -> dict[str, str]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            temperature=0,
+            response_format={'type': 'json_object'},
+            messages=[
+                {'role': 'system', 'content': _PROMPT.format(field=field, known=json.dumps(known))},
+                {'role': 'user', 'content': json.dumps(values)},
+            ],
+        )
+        mappings = json.loads(response.choices[0].message.content).get('mappings', {})
+        # Anything missing or malformed in the answer is left as it is, and asked again next round
+        return {value: mappings[value].strip() for value in values
+                if isinstance(mappings.get(value), str) and mappings[value].strip()}
+
+
+class StubClient:
+    """Offline client for running and testing the stage without a model.
+
+    Answers from `answers` and maps any other value to itself with runs of spaces collapsed.
+    Every batch it is sent is kept in `batches`.
+    """
+
+    model = 'stub'
+
+    def __init__(self, answers: dict[str, str] | None = None):
+        self.answers = dict(answers or {})
+        self.batches: list[list[str]] = []
+        self._lock = threading.Lock()
+
+    def normalize(self, field: str, values: list[str], known: list[str]) -> dict[str, str]:
+        with self._lock:
+            self.batches.append(list(values))
+        return {value: self.answers.get(value, ' '.join(value.split())) for value in values}
+
+
+class Normalizer:
+    """Canonical spellings for key columns: local cache first, then batched model requests.
+
+    Only distinct values are looked at. A value already on file, or sharing its folded form
+    with one on file, costs nothing; the rest are folded into groups and one representative
+    per group is sent, in batches of `batch_size` with at most `concurrency` requests in
+    flight. Answers are stored for good, so a repeated round makes no requests. A batch that
+    fails is logged and its values are kept as they are.
+    """
+
+    def __init__(self, client=None, columns=NORMALIZE_COLUMNS, batch_size: int = NORMALIZE_BATCH_SIZE,
+                 concurrency: int = NORMALIZE_CONCURRENCY, path: str | None = None):
+        self.client = client
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.path = path
+        self.stats = {'distinct': 0, 'cached': 0, 'requested': 0, 'requests': 0, 'failed': 0}
+        self.mappings: dict[str, dict[str, str]] = {}  # column -> spelling map of the last frames
+
+    def _client(self):
+        if self.client is None:
+            self.client = OpenAIClient()
+        return self.client
+
+    def _request(self, client, field: str, values: list[str], known: list[str]) -> dict[str, str] | None:
+        try:
+            return client.normalize(field, values, known)
+        except Exception:
+            logger.exception('Normalizing %d %s values failed', len(values), field)
+            return None
+
+    def mapping(self, field: str, values) -> dict[str, str]:
+        """Canonical spelling of each of `values`; values that could not be mapped map to themselves."""
+        # Blanks have nothing to normalize
+        values = sorted({str(value) for value in values if str(value).strip()})
+        self.stats['distinct'] += len(values)
+        with closing(_connect(self.path)) as conn:
+            stored = conn.execute('SELECT raw, folded, canonical FROM mappings WHERE field = ?', (field,)).fetchall()
+        by_raw = {raw: canonical for raw, _, canonical in stored}
+        by_folded = {folded: canonical for _, folded, canonical in stored}
+
+        mapping, groups = {}, {}
+        for value in values:
+            if value in by_raw:
+                mapping[value] = by_raw[value]
+            elif fold(value) in by_folded:
+                mapping[value] = by_folded[fold(value)]
+            else:
+                groups.setdefault(fold(value), []).append(value)
+        self.stats['cached'] += len(mapping)
+
+        # Sorted representatives put related spellings ("DTG", "DTG Print") in the same batch
+        pending = sorted(members[0] for members in groups.values())
+        if pending:
+            client = self._client()  # a missing package or API key fails the stage, not each batch
+            known = sorted(set(by_raw.values()))[:MAX_KNOWN_VALUES]
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            self.stats['requested'] += len(pending)
+            self.stats['requests'] += len(batches)
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency), thread_name_prefix='normalize') as pool:
+                answers = list(pool.map(lambda batch: self._request(client, field, batch, known), batches))
+            learned = {}
+            for batch, answer in zip(batches, answers):
+                if answer is None:
+                    self.stats['failed'] += len(batch)
+                    continue
+                for representative in batch:
+                    if representative in answer:
+                        for value in groups[fold(representative)]:
+                            learned[value] = answer[representative]
+            self._store(field, learned)
+            mapping.update(learned)
+        return {value: mapping.get(value, value) for value in values}
+
+    def _store(self, field: str, learned: dict[str, str]):
+        if not learned:
+            return
+        model = getattr(self.client, 'model', type(self.client).__name__)
+        saved_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with closing(_connect(self.path)) as conn, conn:
+            conn.executemany('INSERT OR IGNORE INTO mappings VALUES (?, ?, ?, ?, ?, ?)',
+                             ((field, raw, fold(raw), canonical, model, saved_at) for raw, canonical in learned.items()))
+
+    def normalize_frames(self, frames: list[pd.DataFrame]) -> list[pd.DataFrame]:
+        """The frames with the key columns rewritten to canonical spellings.
+
+        Distinct values are gathered across all frames first, so every value is resolved once.
+        """
+        frames = list(frames)
+        for col in self.columns:
+            present = [df[col] for df in frames if col in df.columns]
+            if not present:
+                continue
+            values = set()
+            for series in present:
+                values.update(_distinct(series))
+            mapping = self.mappings[col] = self.mapping(col, values)
+            frames = [df.assign(**{col: _apply(df[col], mapping)}) if col in df.columns else df for df in frames]
+        return frames
+
+    def signature(self, df: pd.DataFrame) -> str:
+        """Digest of the canonical spelling given to each value of `df` by normalize_frames()."""
+        digest = hashlib.sha256()
+        for col in self.columns:
+            if col in df.columns:
+                mapping = self.mappings.get(col, {})
+                for value in sorted(str(value) for value in _distinct(df[col])):
+                    digest.update(f'{col}\x1f{value}\x1f{mapping.get(value, value)}\x1e'.encode())
+        return digest.hexdigest()[:16]
+
+
+def _distinct(series: pd.Series) -> list:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories.tolist()
+    return series.dropna().unique().tolist()
+
+
+def _apply(series: pd.Series, mapping: dict[str, str]) -> pd.Series:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Variants collapse into one category; categories stay sorted, as when read from a file
+        old = series.cat.categories
+        mapped = pd.Index([mapping.get(str(value), str(value)) for value in old], dtype=old.dtype)
+        categories = mapped.unique().sort_values()
+        codes = series.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, categories.get_indexer(mapped)[codes], -1)
+        return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=series.index, name=series.name)
+    return series.map(lambda value: mapping.get(str(value), value) if pd.notna(value) else value)
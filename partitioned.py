@@ -0,0 +1,216 @@
+import logging
+import math
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+import numpy as np
+import pandas as pd
+
+from bidding_core import (
+    KEY_COLUMNS, PARTNER_COLUMN, PARTNER_COLUMNS_ATTR, PRODUCT_KEY_COLUMN,
+    aggregate_bids, build_product_key, compact_partners, key_hashes,
+)
+from ingestion import concat_dtypes, concat_frames, load_supplier_files, with_categories
+from instrumentation import measure, observe
+from storage import data_path
+
+# Memory the out-of-core aggregation aims to stay within, besides the largest single file
+PARTITION_MEMORY_MB = float(os.environ.get('PRICINGAI_PARTITION_MEMORY_MB', 512))
+# Peak memory while partitions are aggregated, per byte of their spilled rows
+AGGREGATION_MEMORY_FACTOR = 3.0
+# Upper bound on partitions; parsed rows take up to about 4x their file size (Excel is compressed)
+MAX_PARTITIONS = 256
+SOURCE_MEMORY_FACTOR = 4.0
+
+# Processes for sharded aggregation; 1 aggregates in the calling process
+AGGREGATION_WORKERS = int(os.environ.get('PRICINGAI_AGGREGATION_WORKERS', os.cpu_count() or 1))
+# Below this many supplier rows, moving shards between processes costs more than it saves
+MIN_SHARDED_ROWS = int(os.environ.get('PRICINGAI_SHARD_MIN_ROWS', 500_000))
+
+logger = logging.getLogger('pricingai.partitioned')
+
+# Worker pools by size, started on first use and shared by every session
+_pools: dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _source_size(source) -> int:
+    if hasattr(source, 'getvalue'):
+        return len(source.getvalue())
+    return os.path.getsize(source)
+
+
+def partition_count(source_bytes: int, memory_mb: float) -> int:
+    """Partitions for sources of this size: enough that one aggregates well within the budget."""
+    needed = source_bytes * SOURCE_MEMORY_FACTOR * AGGREGATION_MEMORY_FACTOR / (memory_mb * 2**20)
+    return min(MAX_PARTITIONS, max(1, math.ceil(2 * needed)))
+
+
+def partition_of(hashes: np.ndarray, partitions: int) -> np.ndarray:
+    return (hashes.view(np.uint64) % np.uint64(partitions)).astype(np.intp)
+
+
+def _groups(sizes: list[int], budget: float):
+    # Neighbouring partitions are aggregated together while they fit; keys never span partitions
+    group, total = [], 0
+    for partition, size in enumerate(sizes):
+        if not size:
+            continue
+        if group and (total + size) * AGGREGATION_MEMORY_FACTOR > budget:
+            yield group
+            group, total = [], 0
+        group.append(partition)
+        total += size
+    if group:
+        yield group
+
+
+def _read_partition(path: str) -> list[pd.DataFrame]:
+    frames = []
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                frames.append(pickle.load(f))
+            except EOFError:
+                return frames
+
+
+def merge_partitions(parts: list[pd.DataFrame], partners: list, key_dtypes: dict) -> pd.DataFrame:
+    """One bid table from tables aggregated over disjoint sets of product keys.
+
+    Rows are put in the sorted key order and partner columns in `partners` order, so the
+    result is the table aggregate_bids(sparse=True) builds from all the rows at once.
+    """
+    end = parts[0].columns.get_loc('Bid Selected Unit Price') + 1
+    base = with_categories(pd.concat([part.iloc[:, :end] for part in parts], ignore_index=True), key_dtypes)
+    order = np.argsort(build_product_key(base).to_numpy(), kind='stable')
+
+    # One dense partner column at a time
+    columns = {}
+    for partner in partners:
+        column = np.concatenate([
+            part[partner].to_numpy(dtype=float, na_value=np.nan) if partner in part.columns else np.full(len(part), np.nan)
+            for part in parts
+        ])
+        columns[partner] = pd.arrays.SparseArray(column[order], fill_value=np.nan)
+    bids_df = pd.concat([base.take(order).reset_index(drop=True), pd.DataFrame(columns, index=base.index)], axis=1)
+    bids_df.attrs[PARTNER_COLUMNS_ATTR] = [str(partner) for partner in partners]
+    return compact_partners(bids_df)
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        if workers not in _pools:
+            # Workers start from a clean process rather than a fork of the threaded server
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _pools[workers]
+
+
+def _aggregate_shard(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.assign(**{PRODUCT_KEY_COLUMN: build_product_key(df)})
+    return aggregate_bids(df, sparse=True)
+
+
+def aggregate_sharded(combined_df: pd.DataFrame, workers: int = AGGREGATION_WORKERS,
+                      min_rows: int = MIN_SHARDED_ROWS) -> pd.DataFrame:
+    """aggregate_bids(sparse=True) with the rows sharded by product key over a process pool.
+
+    Each worker builds keys and picks winners for its own keys; the shards are merged in key
+    order, so the table is the one a single process builds. Runs serially with one worker or
+    fewer than `min_rows` rows.
+    """
+    if workers <= 1 or len(combined_df) < min_rows:
+        if PRODUCT_KEY_COLUMN not in combined_df.columns:
+            combined_df = combined_df.assign(**{PRODUCT_KEY_COLUMN: build_product_key(combined_df)})
+        return aggregate_bids(combined_df, sparse=True)
+
+    # All rows of a key share its SKU, so sharding by SKU keeps keys whole at half the cost of
+    # hashing every key column. Rows keep their order within a shard, which decides last
+    # quotes and winner order.
+    rows = combined_df.drop(columns=PRODUCT_KEY_COLUMN, errors='ignore')
+    shard = pd.factorize(rows['Dandpo SKU'])[0] % workers
+    order = np.argsort(shard, kind='stable')
+    bounds = np.searchsorted(shard[order], np.arange(workers + 1))
+    shards = [rows.take(order[bounds[i]:bounds[i + 1]]) for i in range(workers) if bounds[i + 1] > bounds[i]]
+    try:
+        parts = list(_pool(workers).map(_aggregate_shard, shards))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): finish here, the next round starts a new pool
+        logger.warning('Aggregation worker pool broke, aggregating %d shards serially', len(shards))
+        with _pools_lock:
+            _pools.pop(workers, None)
+        parts = [_aggregate_shard(df) for df in shards]
+
+    partners = rows[PARTNER_COLUMN].unique().tolist()
+    return merge_partitions(parts, partners, concat_dtypes([rows[KEY_COLUMNS].dtypes.to_dict()]))
+
+
+def load_bids_out_of_core(sources, memory_mb: float = PARTITION_MEMORY_MB,
+                          normalizer=None) -> tuple[pd.DataFrame | None, list[tuple[str, str]]]:
+    """load_bids for rounds larger than memory: the same table, built a slice of keys at a time.
+
+    Files are parsed one by one and their rows spilled to on-disk partitions by product key
+    hash, in upload order. Partitions are then aggregated a group at a time, each group as
+    large as `memory_mb` allows, and the partial tables merged in key order. Peak memory is
+    about the budget plus the largest single file and the finished bid table.
+    """
+    sources = list(sources)
+    partitions = partition_count(sum(_source_size(source) for source in sources), memory_mb)
+    errors, key_dtypes, partners = [], [], {}
+    root = data_path('cache')
+    os.makedirs(root, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='partitions-', dir=root) as spill_dir, ExitStack() as stack:
+        paths = [os.path.join(spill_dir, f'{partition}.pkl') for partition in range(partitions)]
+        files = [stack.enter_context(open(path, 'wb')) for path in paths]
+
+        with measure('partitioning') as perf:
+            for source in sources:
+                frames, file_errors = load_supplier_files([source])
+                errors += file_errors
+                if not frames:
+                    continue
+                df = frames[0][1]
+                if normalizer is not None:
+                    df = normalizer.normalize_frames([df])[0]
+                key_dtypes.append(df[KEY_COLUMNS].dtypes.to_dict())
+                partners.update(dict.fromkeys(df[PARTNER_COLUMN].unique().tolist()))
+                # Rows keep their upload order within each partition
+                partition = partition_of(key_hashes(df), partitions)
+                order = np.argsort(partition, kind='stable')
+                bounds = np.searchsorted(partition[order], np.arange(partitions + 1))
+                for i in range(partitions):
+                    if bounds[i + 1] > bounds[i]:
+                        pickle.dump(df.take(order[bounds[i]:bounds[i + 1]]), files[i], protocol=pickle.HIGHEST_PROTOCOL)
+            for f in files:
+                f.close()
+            observe(perf, None)
+        if not key_dtypes:
+            return None, errors
+
+        key_dtypes = concat_dtypes(key_dtypes)
+        sizes = [os.path.getsize(path) for path in paths]
+        budget = memory_mb * 2**20
+        parts = []
+        with measure('aggregation') as perf:
+            for group in _groups(sizes, budget):
+                if sum(sizes[i] for i in group) * AGGREGATION_MEMORY_FACTOR > budget:
+                    logger.warning('Partition %d holds %.0f MB of rows, more than the %.0f MB budget allows',
+                                   group[0], sizes[group[0]] / 2**20, memory_mb)
+                frames = [with_categories(frame, key_dtypes) for i in group for frame in _read_partition(paths[i])]
+                combined_df = concat_frames(frames)
+                del frames
+                combined_df[PRODUCT_KEY_COLUMN] = build_product_key(combined_df)
+                parts.append(aggregate_bids(combined_df, sparse=True))
+                del combined_df
+            observe(perf, None)
+
+    with measure('merge') as perf:
+        bids_df = merge_partitions(parts, list(partners), key_dtypes)
+        observe(perf, bids_df)
+    return bids_df, errors
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from bidding_core import (
+    KEY_COLUMNS, PARTNER_COLUMN, PARTNER_COLUMNS_ATTR, PRICE_COLUMN, PRODUCT_KEY_COLUMN,
+    add_ranking, build_product_key, compact_partners, key_hashes,
+)
+from ingestion import concat_dtypes, concat_frames, load_supplier_files, load_supplier_results, with_categories
+from instrumentation import measure, observe
+from partitioned import AGGREGATION_WORKERS, MIN_SHARDED_ROWS, aggregate_sharded, load_bids_out_of_core
+
+
+def _normalize(frames: list[pd.DataFrame], normalizer) -> list[pd.DataFrame]:
+    with measure('normalization') as perf:
+        frames = normalizer.normalize_frames(frames)
+        observe(perf, None)
+    return frames
+
+
+def load_bids(sources, cache=None, normalizer=None,
+              workers: int = AGGREGATION_WORKERS) -> tuple[pd.DataFrame | None, list[tuple[str, str]]]:
+    """Parse, validate and aggregate supplier sheets into the bid table (without markup).
+
+    Returns the table, or None when no file was usable, and the per-file errors. The partner
+    price matrix is sparse; to_wide() turns it into dense columns. With a result cache,
+    previously parsed uploads are not parsed again. With a Normalizer, the free-text key
+    columns get their canonical spellings before product keys are built. Large rounds are
+    aggregated by `workers` processes (see aggregate_sharded).
+    """
+    with measure('ingestion') as perf:
+        frames, errors = load_supplier_files(sources, cache=cache)
+        combined_df = concat_frames([df for _, df in frames]) if frames else None
+        observe(perf, combined_df)
+    if combined_df is None:
+        return None, errors
+    if normalizer is not None:
+        combined_df = _normalize([combined_df], normalizer)[0]
+    return _aggregate(combined_df, workers), errors
+
+
+def rank_bids(bids_df: pd.DataFrame) -> pd.DataFrame:
+    """Add the runner-up partners, prices and gaps next to the winning bid."""
+    with measure('ranking') as perf:
+        ranked_df = add_ranking(bids_df)
+        observe(perf, ranked_df)
+    return ranked_df
+
+
+# Above this share of changed files a full aggregation is cheaper than patching
+MAX_CHANGED_SHARE = 0.5
+
+
+def _aggregate(combined_df: pd.DataFrame, workers: int = AGGREGATION_WORKERS) -> pd.DataFrame:
+    # Sharded workers build their own keys, so that stage is only timed when run here
+    if workers <= 1 or len(combined_df) < MIN_SHARDED_ROWS:
+        with measure('key_building') as perf:
+            combined_df[PRODUCT_KEY_COLUMN] = build_product_key(combined_df)
+            observe(perf, combined_df)
+    with measure('aggregation') as perf:
+        bids_df = aggregate_sharded(combined_df, workers)
+        observe(perf, bids_df)
+    return bids_df
+
+
+def _file_keys(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Key hash of each row, and a row signature: key, position among the key's rows, partner and price."""
+    keys = key_hashes(df)
+    rank = pd.Series(keys).groupby(keys, sort=False).cumcount().to_numpy()
+    rows = pd.DataFrame({'key': keys, 'rank': rank, PARTNER_COLUMN: df[PARTNER_COLUMN].to_numpy(),
+                         PRICE_COLUMN: df[PRICE_COLUMN].to_numpy()})
+    signatures = pd.util.hash_pandas_object(rows, index=False, categorize=True).to_numpy().view(np.int64)
+    return keys, signatures
+
+
+def _changed_keys(old: tuple[np.ndarray, np.ndarray], new: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    (old_keys, old_rows), (new_keys, new_rows) = old, new
+    return np.concatenate([old_keys[~np.isin(old_rows, new_rows)], new_keys[~np.isin(new_rows, old_rows)]])
+
+
+def _affected_keys(before: list, current: list, files: dict) -> np.ndarray | None:
+    """Product keys whose rows, or the order of their rows, differ between the two uploads.
+
+    A file swapped in at the place of another one among the unchanged files only affects the
+    keys whose rows changed; every key of any other added or removed file is affected. None
+    when the unchanged files were reordered, which changes the row order of every key.
+    """
+    kept = set(before) & set(current)
+    if [h for h in before if h in kept] != [h for h in current if h in kept]:
+        return None
+    replaced = {}
+    if len(before) == len(current):
+        for old, new in zip(before, current):
+            if old not in kept and new not in kept:
+                replaced[new] = old
+    affected = [_changed_keys(files[old], files[new]) for new, old in replaced.items()]
+    affected += [files[h][0] for h in before + current if h not in kept and h not in replaced and h not in replaced.values()]
+    return np.unique(np.concatenate(affected)) if affected else np.array([], dtype=np.int64)
+
+
+def _patch_round(previous: dict, frames: list[pd.DataFrame], keys: list[np.ndarray], affected: np.ndarray) -> pd.DataFrame:
+    # Every current row of an affected key, in upload order, is aggregated again
+    parts = [df[np.isin(file_keys, affected)] for df, file_keys in zip(frames, keys)]
+    parts = [part for part in parts if len(part)]
+    patched = _aggregate(concat_frames(parts)) if parts else None
+
+    previous_bids = previous['bids']
+    kept = previous_bids[~np.isin(previous['bid_keys'], affected)]
+    partners = list(dict.fromkeys(partner for df in frames for partner in df[PARTNER_COLUMN].unique().tolist()))
+    columns = list(previous_bids.columns[:previous_bids.columns.get_loc('Bid Selected Unit Price') + 1]) + partners
+
+    bids_df = pd.concat([kept, patched] if patched is not None else [kept], ignore_index=True).reindex(columns=columns)
+    # Prices are float64 by the supplier schema, so only the key categories and the sparse
+    # layout, which follows each partner's share of quotes, need restoring
+    bids_df = with_categories(bids_df, concat_dtypes([df[KEY_COLUMNS].dtypes.to_dict() for df in frames]))
+
+    # Rows follow the same sorted key order as a full aggregation
+    order = np.argsort(build_product_key(bids_df).to_numpy(), kind='stable')
+    bids_df = bids_df.take(order).reset_index(drop=True)
+    bids_df.attrs[PARTNER_COLUMNS_ATTR] = [str(partner) for partner in partners]
+    return compact_partners(bids_df)
+
+
+def update_bids(sources, previous: dict | None = None, cache=None, normalizer=None,
+                memory_mb: float | None = None, workers: int = AGGREGATION_WORKERS) -> dict:
+    """Aggregate supplier sheets, re-aggregating only the product keys touched by changed files.
+
+    `previous` is the round returned for the previous upload set. Files are compared by
+    content hash, and a re-submitted file row by row: keys whose rows changed are aggregated
+    again from every file's rows for those keys, all other keys keep their previous rows. The
+    result matches a full aggregation, which runs instead when the unchanged files were
+    reordered or more than MAX_CHANGED_SHARE of the files changed.
+
+    With a Normalizer, each file's key columns get their canonical spellings first, and the
+    file is told apart by the spellings it was given as well as by its content.
+
+    With `memory_mb`, the round is aggregated out of core within about that much memory
+    (see load_bids_out_of_core); such a round is not patched, and the next one starts over.
+    A full aggregation of a large round is sharded over `workers` processes.
+
+    Returns the round: {'bids', 'errors', 'files', 'bid_keys'}, where 'bids' is None when no
+    file was usable.
+    """
+    if memory_mb is not None:
+        bids_df, errors = load_bids_out_of_core(sources, memory_mb, normalizer)
+        return {'bids': bids_df, 'errors': errors, 'files': [],
+                'bid_keys': key_hashes(bids_df) if bids_df is not None else None}
+
+    with measure('ingestion') as perf:
+        results = load_supplier_results(sources, cache=cache)
+        loaded = [(content_hash, df) for _, content_hash, df, error in results if error is None]
+        observe(perf, None)
+    errors = [(name, error) for name, _, _, error in results if error is not None]
+    round_ = {'bids': None, 'errors': errors, 'files': [], 'bid_keys': None}
+    if not loaded:
+        return round_
+    if normalizer is not None:
+        frames = _normalize([df for _, df in loaded], normalizer)
+        # Values left as they are now may be mapped in a later round, which changes the file's keys
+        loaded = [(f'{content_hash}:{normalizer.signature(df)}', normalized)
+                  for (content_hash, df), normalized in zip(loaded, frames)]
+
+    with measure('change_detection') as perf:
+        files = dict(previous['files']) if previous and previous['bids'] is not None else {}
+        for content_hash, df in loaded:
+            if content_hash not in files:
+                files[content_hash] = _file_keys(df) if cache is None else \
+                    cache.get_or_compute(('supplier_keys', content_hash), lambda df=df: _file_keys(df))
+        before = [h for h, _ in previous['files']] if files and previous and previous['bids'] is not None else None
+        current = [h for h, _ in loaded]
+        affected = None
+        if before is not None and len(set(before)) == len(before) and len(set(current)) == len(current):
+            changed = len(set(before) ^ set(current))
+            if changed <= MAX_CHANGED_SHARE * len(current):
+                affected = _affected_keys(before, current, files)
+        observe(perf, None)
+
+    if before == current:
+        bids_df = previous['bids']
+    elif affected is not None:
+        with measure('incremental_aggregation') as perf:
+            bids_df = _patch_round(previous, [df for _, df in loaded], [files[h][0] for h in current], affected)
+            observe(perf, bids_df)
+    else:
+        bids_df = _aggregate(concat_frames([df for _, df in loaded]), workers)
+
+    round_['bids'] = bids_df
+    round_['files'] = [(h, files[h]) for h in current]
+    round_['bid_keys'] = key_hashes(bids_df)
+    return round_
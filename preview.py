@@ -0,0 +1,143 @@
+import math
+import uuid
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from ingestion import excel_sheet_names, is_excel
+from instrumentation import add_records, measure, observe
+from jobs import QUEUED, jobs
+from result_cache import cache, upload_hash
+
+PAGE_SIZES = [100, 500, 1000, 5000]
+
+# A job finishing within this long is shown straight away instead of behind a progress panel
+JOB_WAIT_SECONDS = 0.3
+JOB_POLL_SECONDS = 1.0
+
+
+def price_match_mask(df: pd.DataFrame, column: str) -> np.ndarray:
+    """Boolean cell mask: numeric cells equal (to 2 decimals) to the row's value in `column`."""
+    mask = np.zeros(df.shape, dtype=bool)
+    bid = pd.to_numeric(df[column], errors='coerce').round(2).to_numpy(dtype=float)
+    numeric = [
+        i for i, dtype in enumerate(df.dtypes)
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+    ]
+    if numeric:
+        values = df.iloc[:, numeric].astype(float).round(2).to_numpy()
+        mask[:, numeric] = values == bid[:, None]
+    return mask
+
+
+def worksheet_picker(upload, key: str) -> str | None:
+    """Worksheet to read from an Excel upload, asked for only when the workbook has several."""
+    if upload is None or not is_excel(upload):
+        return None
+    sheets = cache.get_or_compute(('worksheets', upload_hash(upload)), lambda: excel_sheet_names(upload))
+    if len(sheets) == 1:
+        return sheets[0]
+    return st.selectbox(f'Worksheet of {upload.name}', sheets, key=key)
+
+
+def paginated_preview(df: pd.DataFrame, key: str, style=None):
+    """Show one page of `df`; `style(page_df, rows)` styles only the visible slice."""
+    total = len(df)
+    size_col, page_col, _ = st.columns([1, 1, 2])
+    with size_col:
+        page_size = st.selectbox('Rows per page', PAGE_SIZES, key=f'{key}_page_size')
+    pages = max(1, math.ceil(total / page_size))
+    # Keep the page in range when the table shrinks or the page size grows
+    page_key = f'{key}_page'
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    with page_col:
+        page = st.number_input('Page', min_value=1, max_value=pages, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    rows = slice(start, min(start + page_size, total))
+    view = df.iloc[rows]
+    # The Styler is evaluated when st.dataframe serializes it, so this times styling and rendering
+    with measure('preview') as perf:
+        observe(perf, view)
+        st.dataframe(style(view, rows) if style is not None else view, use_container_width=True)
+    if total:
+        st.caption(f'Rows {rows.start + 1:,}–{rows.stop:,} of {total:,} (page {page} of {pages})')
+
+
+def performance_panel(records: list[dict]):
+    """Collapsible table of the stages measured during this run."""
+    with st.expander('Performance'):
+        if records:
+            st.dataframe(pd.DataFrame(records).drop(columns='tab'), hide_index=True, use_container_width=True)
+        st.caption('Seconds are wall time; memory is the process RSS after the stage and its peak so far. '
+                   'Cached stages do not run again and are not listed; downloads are logged when built.')
+        stats = cache.stats()
+        st.caption(f"Shared result cache: {stats['entries']} tables, {stats['memory_mb']:,} of "
+                   f"{stats['budget_mb']:,} MB; {stats['spilled_entries']} spilled to disk "
+                   f"({stats['spilled_mb']:,} MB); {stats['hits']} hits, {stats['disk_hits']} disk hits, "
+                   f"{stats['misses']} misses, {stats['evictions']} evictions")
+
+
+class JobPending(BaseException):
+    """Ends a tab's run while its background job is busy; app.py lets the other tabs carry on.
+
+    A BaseException, like st.stop(), so a tab's own error handling does not swallow it.
+    """
+
+
+def _session_id() -> str:
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _job_progress(job_id: str, slot: str, label: str):
+    # Only this fragment reruns while the job is busy; the rest of the page stays usable
+    job = jobs.get(job_id)
+    if job is None or job.done():
+        st.rerun()
+    stage = 'waiting for a free worker' if job.status == QUEUED else (job.stage or 'starting')
+    st.progress(job.progress(), text=f'{label}: {stage} ({job.elapsed():.0f}s)')
+    if st.button('Cancel', key=f'{slot}_cancel'):
+        jobs.cancel(job_id, _session_id())
+        st.session_state[f'{slot}_cancelled'] = job.key
+        st.rerun()
+
+
+def run_in_background(slot: str, key, compute, label: str, stages=()):
+    """Result of `compute()`, built by a background job that keeps running across reruns.
+
+    `slot` names the job in this session and `key` identifies its inputs; a new key replaces the
+    slot's job. While the job runs the tab stops here (JobPending) behind a progress bar with a
+    cancel button. Raises the job's error when it failed.
+    """
+    job_key, cancelled_key = f'{slot}_job', f'{slot}_cancelled'
+    if st.session_state.get(cancelled_key) == key:
+        st.warning(f'{label} was cancelled.')
+        if st.button('Run again', key=f'{slot}_restart'):
+            del st.session_state[cancelled_key]
+            st.rerun()
+        raise JobPending(slot)
+
+    job = jobs.get(st.session_state.get(job_key))
+    if job is not None and job.key != key:
+        # Inputs changed: stop the old build unless another session is waiting for it
+        jobs.cancel(job.id, _session_id())
+    if job is None or job.key != key or job.cancel_requested:
+        job = jobs.submit(key, compute, stages=stages, watcher=_session_id())
+        st.session_state[job_key] = job.id
+
+    if not job.wait(JOB_WAIT_SECONDS):
+        _job_progress(job.id, slot, label)
+        raise JobPending(slot)
+    if st.session_state.get(f'{slot}_reported') != job.id:
+        st.session_state[f'{slot}_reported'] = job.id
+        add_records(job.records)
+    try:
+        return job.result()
+    except Exception:
+        # A failed build is reported once; the next rerun tries again
+        del st.session_state[job_key]
+        raise
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import sqlite3
+import sys
+import threading
+from contextlib import closing
+from datetime import date, datetime, timezone
+import numpy as np
+import pandas as pd
+
+from bidding_core import PARTNER_COLUMNS_ATTR, key_hashes
+from storage import data_path
+
+HISTORY_DB = 'price_history.sqlite'
+
+logger = logging.getLogger('pricingai.history')
+
+PREVIOUS_PRICE_COLUMN = 'Previous Best Price'
+PRICE_DELTA_COLUMN = 'Price Delta'
+PREVIOUS_ROUND_COLUMN = 'Previous Round'
+
+# Products are identified across rounds by a 64-bit hash of their key columns. Every table is
+# clustered on (key_hash, round_date, round_id), so "latest price before this round" is one seek;
+# the by_round indexes find a round's prices when the same uploads are recorded again
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    round_id INTEGER PRIMARY KEY,
+    round_date TEXT NOT NULL,
+    upload_key TEXT NOT NULL UNIQUE,
+    key_count INTEGER NOT NULL,
+    saved_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS best_prices (
+    key_hash INTEGER NOT NULL,
+    round_date TEXT NOT NULL,
+    round_id INTEGER NOT NULL,
+    sku TEXT,
+    quantity,
+    price REAL NOT NULL,
+    partners TEXT,
+    PRIMARY KEY (key_hash, round_date, round_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS partner_prices (
+    key_hash INTEGER NOT NULL,
+    round_date TEXT NOT NULL,
+    round_id INTEGER NOT NULL,
+    partner TEXT NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (key_hash, round_date, round_id, partner)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS partner_prices_by_partner ON partner_prices (partner, key_hash, round_date);
+CREATE INDEX IF NOT EXISTS best_prices_by_round ON best_prices (round_date, round_id);
+CREATE INDEX IF NOT EXISTS partner_prices_by_round ON partner_prices (round_date, round_id);
+"""
+
+
+def _connect(path: str | None = None) -> sqlite3.Connection:
+    # WAL lets previews read while a round is being written
+    conn = sqlite3.connect(path or data_path(HISTORY_DB), timeout=60)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def round_key(content_hashes) -> str:
+    """One id per set of supplier files, whatever their order or names."""
+    return hashlib.sha256('\n'.join(sorted(content_hashes)).encode()).hexdigest()
+
+
+def _partner_rows(bidding_df: pd.DataFrame, hashes: np.ndarray, round_date: str, round_id: int):
+    for partner in bidding_df.attrs.get(PARTNER_COLUMNS_ATTR, []):
+        prices = pd.to_numeric(bidding_df[partner], errors='coerce').to_numpy(dtype=float)
+        quoted = prices > 0
+        for key_hash, price in zip(hashes[quoted].tolist(), prices[quoted].tolist()):
+            yield key_hash, round_date, round_id, str(partner), price
+
+
+def record_round(bidding_df: pd.DataFrame, upload_key: str, round_date: str | None = None,
+                 path: str | None = None) -> tuple[int, str]:
+    """Append a bid round dated `round_date` (today by default).
+
+    Every set of uploads is kept as its own round. Recording the same set again replaces that
+    round's prices but keeps its id and date, i.e. its place in the history. The round and all
+    its prices are written in one transaction. Returns the round id and date.
+    """
+    round_date = round_date or date.today().isoformat()
+    hashes = key_hashes(bidding_df)
+    # Rows go in key order, which keeps the clustered inserts local
+    order = np.argsort(hashes, kind='stable')
+    bidding_df, hashes = bidding_df.iloc[order], hashes[order]
+    with closing(_connect(path)) as conn, conn:
+        saved_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        existing = conn.execute('SELECT round_id, round_date FROM rounds WHERE upload_key = ?', (upload_key,)).fetchone()
+        if existing:
+            round_id, round_date = existing
+            for table in ('best_prices', 'partner_prices'):
+                conn.execute(f'DELETE FROM {table} WHERE round_date = ? AND round_id = ?', existing)
+            conn.execute('UPDATE rounds SET key_count = ?, saved_at = ? WHERE round_id = ?',
+                         (len(bidding_df), saved_at, round_id))
+        else:
+            round_id = conn.execute('INSERT INTO rounds (round_date, upload_key, key_count, saved_at) VALUES (?, ?, ?, ?)',
+                                    (round_date, upload_key, len(bidding_df), saved_at)).lastrowid
+
+        price = pd.to_numeric(bidding_df['Bid Selected Price'], errors='coerce').to_numpy(dtype=float)
+        bid = ~np.isnan(price)
+        best = zip(
+            hashes[bid].tolist(),
+            bidding_df['Dandpo SKU'].astype(str).to_numpy()[bid].tolist(),
+            bidding_df['Quantity'].to_numpy()[bid].tolist(),
+            price[bid].tolist(),
+            bidding_df['Bid Selected Partners'].astype(str).to_numpy()[bid].tolist(),
+        )
+        conn.executemany('INSERT OR REPLACE INTO best_prices VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         ((key_hash, round_date, round_id, *rest) for key_hash, *rest in best))
+        conn.executemany('INSERT OR REPLACE INTO partner_prices VALUES (?, ?, ?, ?, ?)',
+                         _partner_rows(bidding_df, hashes, round_date, round_id))
+    return round_id, round_date
+
+
+def record_round_async(bidding_df: pd.DataFrame, upload_key: str, round_date: str | None = None,
+                       path: str | None = None) -> threading.Thread:
+    """record_round on a background thread, so a large round does not hold up the preview."""
+    def record():
+        try:
+            record_round(bidding_df, upload_key, round_date, path)
+        except Exception:
+            logger.exception('Recording bid round %s failed', upload_key)
+
+    thread = threading.Thread(target=record, name=f'price-history-{upload_key[:8]}', daemon=True)
+    thread.start()
+    return thread
+
+
+def previous_best(bidding_df: pd.DataFrame, upload_key: str, round_date: str | None = None,
+                  path: str | None = None) -> pd.DataFrame:
+    """Best price of each product key in the latest recorded round before this one.
+
+    "Before" is in (round date, round id) order, i.e. the order rounds were recorded in: a
+    recorded set of uploads is compared with the rounds recorded ahead of it, a new one with
+    every round up to `round_date` (today by default). Keys go into a temporary table and each
+    is probed against the clustered index, so the cost follows the number of keys, not the
+    length of the history. Returns 'Previous Best Price', 'Price Delta' and 'Previous Round',
+    aligned to `bidding_df`.
+    """
+    round_date = round_date or date.today().isoformat()
+    hashes = key_hashes(bidding_df)
+    with closing(_connect(path)) as conn:
+        bound = conn.execute('SELECT round_date, round_id FROM rounds WHERE upload_key = ?', (upload_key,)).fetchone()
+        bound = bound or (round_date, sys.maxsize)
+        conn.execute('CREATE TEMP TABLE candidate (key_hash INTEGER PRIMARY KEY)')
+        conn.executemany('INSERT OR IGNORE INTO candidate VALUES (?)', ((h,) for h in np.unique(hashes).tolist()))
+        # CROSS JOIN keeps the candidate keys as the outer loop of the plan
+        found = pd.read_sql_query(
+            'SELECT c.key_hash, b.price, b.round_date FROM candidate c '
+            'CROSS JOIN best_prices b ON b.key_hash = c.key_hash AND (b.round_date, b.round_id) = ('
+            '  SELECT p.round_date, p.round_id FROM best_prices p '
+            '  WHERE p.key_hash = c.key_hash AND (p.round_date, p.round_id) < (?, ?) '
+            '  ORDER BY p.round_date DESC, p.round_id DESC LIMIT 1)',
+            conn, params=bound,
+        )
+
+    # Positions rather than reindex(): pandas may try to fit hashes into a RangeIndex and overflow
+    position = pd.Index(found['key_hash']).get_indexer(hashes)
+    hit = position >= 0
+    previous = np.full(len(hashes), np.nan)
+    previous[hit] = found['price'].to_numpy(dtype=float)[position[hit]]
+    previous_round = np.full(len(hashes), None, dtype=object)
+    previous_round[hit] = found['round_date'].to_numpy(dtype=object)[position[hit]]
+    current = pd.to_numeric(bidding_df['Bid Selected Price'], errors='coerce').to_numpy(dtype=float)
+    return pd.DataFrame({
+        PREVIOUS_PRICE_COLUMN: previous,
+        PRICE_DELTA_COLUMN: np.round(current - previous, 2),
+        PREVIOUS_ROUND_COLUMN: previous_round,
+    }, index=bidding_df.index)
+
+
+def list_rounds(path: str | None = None) -> pd.DataFrame:
+    with closing(_connect(path)) as conn:
+        return pd.read_sql_query('SELECT * FROM rounds ORDER BY round_date, round_id', conn)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# How duplicate SKU/quantity keys within one sheet are handled before the join
+DUPLICATE_POLICIES = ['reject', 'first', 'last', 'min', 'max', 'mean']
+
+SKU_KEY = '_QC_SKU'
+QTY_KEY = '_QC_QTY'
+PRICE_KEY = '_QC_PRICE'
+
+
+class DuplicateKeyError(ValueError):
+    def __init__(self, duplicates: dict[str, pd.DataFrame]):
+        self.duplicates = duplicates
+        counts = ', '.join(f'{sheet}: {len(dups)}' for sheet, dups in duplicates.items() if len(dups))
+        super().__init__(f'Duplicate SKU/quantity keys found ({counts})')
+
+
+def key_frame(df: pd.DataFrame, sku_col: str, qty_col: str, price_col: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        SKU_KEY: df[sku_col],
+        QTY_KEY: df[qty_col],
+        PRICE_KEY: pd.to_numeric(df[price_col], errors='coerce'),
+    })
+
+
+def _align_key_dtypes(a: pd.DataFrame, b: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Join natively: numbers stay numbers, anything else is compared as text
+    for col in (SKU_KEY, QTY_KEY):
+        if not (pd.api.types.is_numeric_dtype(a[col]) and pd.api.types.is_numeric_dtype(b[col])):
+            a[col] = a[col].astype('string')
+            b[col] = b[col].astype('string')
+        else:
+            dtype = np.result_type(a[col].dtype, b[col].dtype)
+            a[col] = a[col].astype(dtype)
+            b[col] = b[col].astype(dtype)
+    return a, b
+
+
+def duplicate_keys(keys: pd.DataFrame) -> pd.DataFrame:
+    """Rows whose SKU/quantity key occurs more than once, with the occurrence count."""
+    dup = keys.duplicated([SKU_KEY, QTY_KEY], keep=False)
+    counts = keys[dup].groupby([SKU_KEY, QTY_KEY], sort=True, dropna=False).size().rename('Count').reset_index()
+    return counts.rename(columns={SKU_KEY: 'SKU', QTY_KEY: 'Quantity'})
+
+
+def dedupe_keys(keys: pd.DataFrame, policy: str) -> pd.DataFrame:
+    if policy in ('first', 'last'):
+        return keys.drop_duplicates([SKU_KEY, QTY_KEY], keep=policy)
+    return keys.groupby([SKU_KEY, QTY_KEY], sort=False, dropna=False, as_index=False)[PRICE_KEY].agg(policy)
+
+
+def qc_status(price_a: pd.Series, price_b: pd.Series, tolerance: float = 0.0) -> np.ndarray:
+    """MATCH/MISMATCH/MISSING per row; prices are compared at 2 decimals within `tolerance`."""
+    a = price_a.to_numpy(dtype=float).round(2)
+    b = price_b.to_numpy(dtype=float).round(2)
+    missing = np.isnan(a) | np.isnan(b)
+    # Small epsilon so a tolerance of 0.01 accepts a one-cent difference despite float error
+    match = np.abs(a - b) <= tolerance + 1e-9
+    return np.select([missing, match], ['MISSING', 'MATCH'], 'MISMATCH')
+
+
+def compare_catalogs(df_a: pd.DataFrame, df_b: pd.DataFrame,
+                     sku_col_a: str, qty_col_a: str, price_col_a: str,
+                     sku_col_b: str, qty_col_b: str, price_col_b: str,
+                     tolerance: float = 0.0, duplicates: str = 'reject') -> tuple[pd.DataFrame, dict[str, pd.DataFrame]]:
+    """Outer-join two sheets on SKU and quantity and classify every key.
+
+    Returns the QC table and the duplicate-key report per sheet. With duplicates='reject'
+    any duplicate raises DuplicateKeyError; the other policies collapse each duplicate key
+    to a single price before the join so it cannot fan out.
+    """
+    keys_a = key_frame(df_a, sku_col_a, qty_col_a, price_col_a)
+    keys_b = key_frame(df_b, sku_col_b, qty_col_b, price_col_b)
+    keys_a, keys_b = _align_key_dtypes(keys_a, keys_b)
+
+    report = {'Sheet A': duplicate_keys(keys_a), 'Sheet B': duplicate_keys(keys_b)}
+    if any(len(dups) for dups in report.values()):
+        if duplicates == 'reject':
+            raise DuplicateKeyError(report)
+        keys_a = dedupe_keys(keys_a, duplicates)
+        keys_b = dedupe_keys(keys_b, duplicates)
+
+    merged = pd.merge(
+        keys_a.rename(columns={PRICE_KEY: 'Price A'}),
+        keys_b.rename(columns={PRICE_KEY: 'Price B'}),
+        on=[SKU_KEY, QTY_KEY], how='outer', validate='one_to_one',
+    )
+
+    return qc_table(merged, sku_col_a, qty_col_a, tolerance), report
+
+
+def qc_table(merged: pd.DataFrame, sku_name: str, qty_name: str, tolerance: float = 0.0) -> pd.DataFrame:
+    """Lay out joined keys and prices ('Price A'/'Price B') as the QC report."""
+    # Ensure unique column names to avoid styling conflicts
+    if qty_name == sku_name:
+        qty_name = f'{qty_name}_1'
+    return pd.DataFrame({
+        sku_name: merged[SKU_KEY],
+        qty_name: merged[QTY_KEY],
+        'Price A': merged['Price A'],
+        'Price B': merged['Price B'],
+        'QC Status': qc_status(merged['Price A'], merged['Price B'], tolerance),
+    })
@@ -0,0 +1,120 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+import pandas as pd
+
+from qc_core import SKU_KEY, QTY_KEY, PRICE_KEY, DuplicateKeyError, dedupe_keys, duplicate_keys, key_frame, qc_table
+from storage import data_path
+
+REFERENCE_DB = 'reference_catalogs.sqlite'
+
+# Rows are clustered on (name, sku, qty), so probing a reference is an index lookup
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reference_catalogs (
+    name TEXT PRIMARY KEY,
+    sku_col TEXT NOT NULL,
+    qty_col TEXT NOT NULL,
+    price_col TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    saved_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reference_rows (
+    name TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    qty NOT NULL,
+    price REAL,
+    PRIMARY KEY (name, sku, qty)
+) WITHOUT ROWID;
+"""
+
+
+def _connect(path: str | None = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or data_path(REFERENCE_DB))
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _key_rows(keys: pd.DataFrame) -> list[tuple]:
+    # SKUs are stored as text; numeric quantities as numbers, anything else as text
+    sku = keys[SKU_KEY].astype('string').fillna('')
+    qty = keys[QTY_KEY]
+    if pd.api.types.is_numeric_dtype(qty):
+        qty = qty.astype(float).astype(object).where(qty.notna(), '')
+    else:
+        qty = qty.astype('string').fillna('')
+    price = keys[PRICE_KEY].astype(float)
+    return list(zip(sku.tolist(), qty.tolist(), price.tolist()))
+
+
+def _unique_keys(df: pd.DataFrame, sku_col: str, qty_col: str, price_col: str,
+                 duplicates: str, sheet: str) -> tuple[pd.DataFrame, dict[str, pd.DataFrame]]:
+    keys = key_frame(df, sku_col, qty_col, price_col)
+    report = {sheet: duplicate_keys(keys)}
+    if len(report[sheet]):
+        if duplicates == 'reject':
+            raise DuplicateKeyError(report)
+        keys = dedupe_keys(keys, duplicates)
+    return keys, report
+
+
+def list_references(path: str | None = None) -> pd.DataFrame:
+    with closing(_connect(path)) as conn:
+        return pd.read_sql_query('SELECT * FROM reference_catalogs ORDER BY name', conn)
+
+
+def save_reference(name: str, df: pd.DataFrame, sku_col: str, qty_col: str, price_col: str,
+                   duplicates: str = 'reject', path: str | None = None) -> int:
+    """Store a sheet's SKU, quantity and price as a named reference, replacing any previous one."""
+    keys, _ = _unique_keys(df, sku_col, qty_col, price_col, duplicates, 'Reference')
+    rows = _key_rows(keys)
+    saved_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    with closing(_connect(path)) as conn, conn:
+        conn.execute('DELETE FROM reference_rows WHERE name = ?', (name,))
+        conn.execute('DELETE FROM reference_catalogs WHERE name = ?', (name,))
+        conn.executemany('INSERT INTO reference_rows VALUES (?, ?, ?, ?)', ((name, *row) for row in rows))
+        conn.execute('INSERT INTO reference_catalogs VALUES (?, ?, ?, ?, ?, ?)',
+                     (name, sku_col, qty_col, price_col, len(rows), saved_at))
+    return len(rows)
+
+
+def delete_reference(name: str, path: str | None = None):
+    with closing(_connect(path)) as conn, conn:
+        conn.execute('DELETE FROM reference_rows WHERE name = ?', (name,))
+        conn.execute('DELETE FROM reference_catalogs WHERE name = ?', (name,))
+
+
+def compare_with_reference(name: str, df_b: pd.DataFrame, sku_col_b: str, qty_col_b: str, price_col_b: str,
+                           tolerance: float = 0.0, duplicates: str = 'reject', include_reference_only: bool = True,
+                           path: str | None = None) -> tuple[pd.DataFrame, dict[str, pd.DataFrame]]:
+    """QC a candidate sheet (Sheet B) against a stored reference (Sheet A).
+
+    Candidate keys go into a temporary table and are probed against the reference index;
+    only matching reference rows (plus, optionally, reference keys absent from the
+    candidate) are read back, never the whole reference.
+    """
+    keys, report = _unique_keys(df_b, sku_col_b, qty_col_b, price_col_b, duplicates, 'Sheet B')
+    with closing(_connect(path)) as conn:
+        meta = conn.execute('SELECT sku_col, qty_col FROM reference_catalogs WHERE name = ?', (name,)).fetchone()
+        if meta is None:
+            raise KeyError(f'No reference catalog named {name!r}')
+        conn.execute('CREATE TEMP TABLE candidate (sku TEXT NOT NULL, qty NOT NULL, price REAL, '
+                     'PRIMARY KEY (sku, qty)) WITHOUT ROWID')
+        conn.executemany('INSERT INTO candidate VALUES (?, ?, ?)', _key_rows(keys))
+        query = (
+            'SELECT c.sku, c.qty, r.price AS price_a, c.price AS price_b FROM candidate c '
+            'LEFT JOIN reference_rows r ON r.name = ? AND r.sku = c.sku AND r.qty = c.qty'
+        )
+        params = [name]
+        if include_reference_only:
+            query += (
+                ' UNION ALL SELECT r.sku, r.qty, r.price, NULL FROM reference_rows r WHERE r.name = ? '
+                'AND NOT EXISTS (SELECT 1 FROM candidate c WHERE c.sku = r.sku AND c.qty = r.qty)'
+            )
+            params.append(name)
+        merged = pd.read_sql_query(query + ' ORDER BY 1, 2', conn, params=params)
+
+    merged.columns = [SKU_KEY, QTY_KEY, 'Price A', 'Price B']
+    merged['Price A'] = merged['Price A'].astype(float)
+    merged['Price B'] = merged['Price B'].astype(float)
+    sku_col_a, qty_col_a = meta
+    return qc_table(merged, sku_col_a, qty_col_a, tolerance), report
@@ -0,0 +1,183 @@
+import atexit
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from storage import data_path
+
+# Process-wide budget for cached tables; least recently used entries are evicted (or spilled) first
+CACHE_BUDGET_MB = float(os.environ.get('PRICINGAI_CACHE_MB', 1024))
+# Evicted entries go to local disk up to this size; 0 disables spilling
+SPILL_BUDGET_MB = float(os.environ.get('PRICINGAI_CACHE_SPILL_MB', 4096))
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload_hash(upload) -> str:
+    return content_hash(upload.getvalue())
+
+
+def estimate_nbytes(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU of computed tables under a memory budget, with optional disk spill.
+
+    Concurrent requests for the same key wait for the first computation instead of repeating it.
+    Cached values are shared between sessions and must not be mutated.
+    """
+
+    def __init__(self, budget_mb: float = CACHE_BUDGET_MB, spill_budget_mb: float = SPILL_BUDGET_MB,
+                 spill_dir: str | None = None):
+        self.budget = int(budget_mb * 2**20)
+        self.spill_budget = int(spill_budget_mb * 2**20)
+        self._spill_dir = spill_dir
+        self._entries: OrderedDict = OrderedDict()  # key -> (value, nbytes)
+        self._spilled: OrderedDict = OrderedDict()  # key -> (path, nbytes)
+        self._pending: dict = {}  # key -> Event set when the computation finishes
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.spilled_nbytes = 0
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                pending = self._pending.get(key)
+                if pending is None:
+                    spilled = self._spilled.pop(key, None)
+                    if spilled is not None:
+                        self.spilled_nbytes -= spilled[1]
+                    self._pending[key] = threading.Event()
+                    break
+            pending.wait()
+
+        try:
+            value = self._load_spilled(spilled) if spilled is not None else None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                value = compute()
+                with self._lock:
+                    self.misses += 1
+            self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def _store(self, key, value):
+        nbytes = estimate_nbytes(value)
+        evicted = []
+        with self._lock:
+            if nbytes > self.budget:
+                evicted.append((key, value, nbytes))
+            else:
+                self._entries[key] = (value, nbytes)
+                self.nbytes += nbytes
+                while self.nbytes > self.budget:
+                    old_key, (old_value, old_nbytes) = self._entries.popitem(last=False)
+                    self.nbytes -= old_nbytes
+                    self.evictions += 1
+                    evicted.append((old_key, old_value, old_nbytes))
+        for old_key, old_value, old_nbytes in evicted:
+            self._spill(old_key, old_value, old_nbytes)
+
+    def _spill(self, key, value, nbytes):
+        if nbytes > self.spill_budget:
+            return
+        try:
+            path = os.path.join(self._spill_path(), hashlib.sha256(repr(key).encode()).hexdigest() + '.pkl')
+            with open(path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            return
+        removed = []
+        with self._lock:
+            self._spilled[key] = (path, nbytes)
+            self.spilled_nbytes += nbytes
+            while self.spilled_nbytes > self.spill_budget:
+                _, (old_path, old_nbytes) = self._spilled.popitem(last=False)
+                self.spilled_nbytes -= old_nbytes
+                removed.append(old_path)
+        for old_path in removed:
+            _remove(old_path)
+
+    def _spill_path(self) -> str:
+        # One directory per process, removed on exit; spilled entries never outlive the cache
+        with self._lock:
+            if self._spill_dir is None:
+                root = data_path('cache')
+                os.makedirs(root, exist_ok=True)
+                self._spill_dir = tempfile.mkdtemp(prefix='spill-', dir=root)
+                atexit.register(shutil.rmtree, self._spill_dir, True)
+            return self._spill_dir
+
+    def _load_spilled(self, spilled):
+        path, _ = spilled
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        finally:
+            _remove(path)
+
+    def clear(self):
+        with self._lock:
+            paths = [path for path, _ in self._spilled.values()]
+            self._entries.clear()
+            self._spilled.clear()
+            self.nbytes = self.spilled_nbytes = 0
+        for path in paths:
+            _remove(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'memory_mb': round(self.nbytes / 2**20, 1),
+                'budget_mb': round(self.budget / 2**20, 1),
+                'spilled_entries': len(self._spilled),
+                'spilled_mb': round(self.spilled_nbytes / 2**20, 1),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Shared by every session of the app process
+cache = ResultCache()
@@ -0,0 +1,9 @@
+import os
+
+# Local on-disk state (reference catalogs, history, caches); override with PRICINGAI_DATA_DIR
+DATA_DIR = os.environ.get('PRICINGAI_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pricingai'))
+
+
+def data_path(*parts: str) -> str:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, *parts)
@@ -0,0 +1,93 @@
+"""Synthetic supplier cost sheets for benchmarks and load testing.
+
+    python synthetic_data.py out/suppliers --skus 5000 --partners 40 --sparsity 0.3 --tie-rate 0.05
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TIERS = [1, 10, 50, 100, 250, 500, 1000]
+
+CATEGORIES = ['T-Shirts', 'Hoodies', 'Caps', 'Mugs', 'Tote Bags', 'Posters', 'Stickers', 'Notebooks']
+COMBINATIONS = ['', 'Red, L', 'Blue, M', 'Black, XL', 'White, S', 'Green, One Size', 'A4', 'A3']
+SPECIFICATIONS = ['DTG Print', 'Screen Print', 'Embroidery', 'Sublimation', 'Offset', 'UV Print']
+
+
+def generate_supplier_sheets(n_skus: int = 1000, n_partners: int = 10, tiers=DEFAULT_TIERS,
+                             sparsity: float = 0.3, tie_rate: float = 0.05, zero_rate: float = 0.02,
+                             seed: int = 0) -> list[tuple[str, pd.DataFrame]]:
+    """One supplier cost sheet per partner, as (file name, frame).
+
+    Every SKU is offered in each quantity tier. A partner skips a product with probability
+    `sparsity` and quotes 0 (declines) with probability `zero_rate`. With probability
+    `tie_rate` a quote is the product's floor price, below any regular quote, so partners
+    that hit it share the win.
+    """
+    rng = np.random.default_rng(seed)
+    tiers = np.asarray(tiers)
+
+    sku = np.repeat(np.arange(n_skus), len(tiers))
+    quantity = np.tile(tiers, n_skus)
+    products = pd.DataFrame({
+        'Category': np.asarray(CATEGORIES, dtype=object)[sku % len(CATEGORIES)],
+        'Dandpo SKU': np.char.add('SKU', sku.astype(str)).astype(object),
+        'Combinations': np.asarray(COMBINATIONS, dtype=object)[rng.integers(len(COMBINATIONS), size=n_skus)][sku],
+        'Printer Specifications': np.asarray(SPECIFICATIONS, dtype=object)[sku % len(SPECIFICATIONS)],
+        'Quantity': quantity,
+        'Sample': np.where(quantity == 1, 'Yes', 'No').astype(object),
+    })
+    # Lead time and weight are part of the product key, so every partner reports the same values
+    lead_time = rng.choice([24, 48, 72, 96, 120], size=n_skus)[sku]
+    unit_weight = rng.uniform(0.05, 1.5, size=n_skus)[sku]
+    # Volume discount: unit price falls with quantity
+    anchor = rng.lognormal(mean=2.5, sigma=0.8, size=n_skus)[sku] * quantity ** 0.85
+    floor_price = np.round(anchor * 0.85, 2)
+
+    sheets = []
+    width = len(str(n_partners))
+    for p in range(n_partners):
+        quoted = rng.random(len(products)) >= sparsity
+        price = np.round(anchor * rng.uniform(0.9, 1.3) * rng.uniform(0.95, 1.05, size=len(products)), 2)
+        price = np.where(rng.random(len(products)) < tie_rate, floor_price, price)
+        price = np.where(rng.random(len(products)) < zero_rate, 0.0, price)
+
+        sheet = products[quoted].copy()
+        sheet['Printer Cost'] = price[quoted]
+        sheet['Lead Time'] = lead_time[quoted]
+        sheet['Weight in kg'] = np.round(unit_weight[quoted] * quantity[quoted], 2)
+        sheet['Partner Name'] = f'Partner {p + 1:0{width}d}'
+        sheets.append((f'supplier_{p + 1:0{width}d}.csv', sheet.reset_index(drop=True)))
+    return sheets
+
+
+def write_supplier_sheets(sheets: list[tuple[str, pd.DataFrame]], out_dir: str) -> list[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, sheet in sheets:
+        path = os.path.join(out_dir, name)
+        sheet.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic supplier cost sheets as CSV files.')
+    parser.add_argument('out', help='Output directory')
+    parser.add_argument('--skus', type=int, default=1000, help='Number of SKUs')
+    parser.add_argument('--tiers', type=int, nargs='+', default=DEFAULT_TIERS, help='Quantity tiers per SKU')
+    parser.add_argument('--partners', type=int, default=10, help='Number of partners (one file each)')
+    parser.add_argument('--sparsity', type=float, default=0.3, help='Share of products a partner does not quote')
+    parser.add_argument('--tie-rate', type=float, default=0.05, help='Share of quotes at the shared floor price')
+    parser.add_argument('--zero-rate', type=float, default=0.02, help='Share of quotes that are 0 (declined)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    sheets = generate_supplier_sheets(args.skus, args.partners, args.tiers, args.sparsity,
+                                      args.tie_rate, args.zero_rate, args.seed)
+    paths = write_supplier_sheets(sheets, args.out)
+    print(f'wrote {len(paths)} files, {sum(len(sheet) for _, sheet in sheets):,} rows to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bidding_core import PARTNER_COLUMNS_ATTR, aggregate_bids, build_product_key, to_wide
+from ingestion import concat_frames, read_supplier_sheet
+
+EDGE_CASES = '''\
+Category,Dandpo SKU,Combinations,Printer Specifications,Quantity,Sample,Printer Cost,Lead Time,Weight in kg,Partner Name
+Mugs,007,White,DTG,10,No,50,3,0.3,Acme
+Mugs,007,White,DTG,10,No,45,3,0.3,Bolt
+Mugs,007,White,DTG,10,No,40,3,0.3,Acme
+Mugs,007,White,DTG,10,No,40,3,0.3,
+Mugs,7,White,DTG,10,No,30,3,0.3,123
+Mugs,7,White,DTG,10,No,0,3,0.3,Acme
+Mugs,7,White,DTG,10,No,-5,3,0.3,Bolt
+Mugs,07,White,DTG,10,No,0,3,0.3,Acme
+'''
+
+
+@pytest.fixture
+def edge_cases(tmp_path):
+    path = tmp_path / 'edge_cases.csv'
+    path.write_text(EDGE_CASES)
+    return read_supplier_sheet(str(path))
+
+
+def test_sku_leading_zeros_are_distinct_keys(edge_cases):
+    keys = build_product_key(edge_cases)
+    assert keys.tolist() == [0, 0, 0, 0, 2, 2, 2, 1]
+
+    bids_df = aggregate_bids(edge_cases)
+    assert bids_df['Dandpo SKU'].tolist() == ['007', '07', '7']
+
+
+def test_edge_case_quotes(edge_cases):
+    bids_df = to_wide(aggregate_bids(edge_cases, sparse=True)).set_index('Dandpo SKU')
+    # A blank partner name is a partner of its own, a numeric one stays text
+    assert bids_df.attrs[PARTNER_COLUMNS_ATTR] == ['Acme', 'Bolt', '', '123']
+
+    # Acme's last quote replaces its first, and ties the blank partner
+    assert bids_df.loc['007', 'Acme'] == 40
+    assert bids_df.loc['007', 'Bid Selected Partners'] == 'Acme, '
+    assert bids_df.loc['007', 'Bid Selected Price'] == 40
+    assert bids_df.loc['007', 'Bid Selected Unit Price'] == 4
+
+    # Zero and negative prices are no quote at all
+    assert bids_df.loc['7', 'Bid Selected Partners'] == '123'
+    assert bids_df.loc['7', 'Bid Selected Price'] == 30
+    assert np.isnan(bids_df.loc['7', 'Acme']) and np.isnan(bids_df.loc['7', 'Bolt'])
+
+    # A key nobody quoted stays in the table without a winner
+    assert pd.isna(bids_df.loc['07', 'Bid Selected Partners'])
+    assert np.isnan(bids_df.loc['07', 'Bid Selected Price'])
+
+
+def test_key_order_does_not_depend_on_the_other_files(tmp_path):
+    header = EDGE_CASES.splitlines()[0] + '\n'
+    first = tmp_path / 'first.csv'
+    first.write_text(header + 'Mugs,9,White,DTG,10,No,5,3,0.3,Acme\n'
+                              ',7,White,DTG,10,No,6,3,0.3,Acme\n')
+    second = tmp_path / 'second.csv'
+    second.write_text(header + 'Caps,8,Blue,DTG,10,No,6,3,0.3,Bolt\n')
+    first, second = read_supplier_sheet(str(first)), read_supplier_sheet(str(second))
+
+    # A file's categories end with the blank one, a union of files' categories starts with it;
+    # rows follow the key values either way
+    assert aggregate_bids(first)['Category'].tolist() == ['', 'Mugs']
+    assert aggregate_bids(concat_frames([first, second]))['Category'].tolist() == ['', 'Caps', 'Mugs']
@@ -0,0 +1,27 @@
+import io
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from bidding_core import ranking_columns
+from excel_export import bidding_sheet_xlsx
+
+
+def bidding_sheet():
+    """One product two partners tie on, so the runner-up price equals the selected one."""
+    df = pd.DataFrame({'Category': ['Mugs'], 'Bid Selected Partners': ['A, B'], 'Bid Selected Price': [40.0]})
+    for col in ranking_columns():
+        df[col] = 'B' if col.endswith('Partner') else 40.0 if col.endswith('Price') else 0.0
+    df['A'] = 40.0
+    df['B'] = 40.0
+    return df
+
+
+def test_runner_up_prices_are_not_highlighted():
+    df = bidding_sheet()
+    ws = load_workbook(io.BytesIO(bidding_sheet_xlsx(df).getvalue())).active
+    ranges = sorted(str(rng) for cf in ws.conditional_formatting for rng in cf.sqref.ranges)
+    # Columns D:I are the ranking columns
+    assert list(df.columns[3:9]) == ranking_columns()
+    assert ranges == ['A2:C2', 'J2:K2']
+
@@ -0,0 +1,73 @@
+import pytest
+
+import ingestion
+from excel_export import to_csv_bytes
+from ingestion import read_supplier_sheet
+from pipeline import load_bids
+
+HEADER = ('Category,Dandpo SKU,Combinations,Printer Specifications,Quantity,Sample,'
+          'Printer Cost,Lead Time,Weight in kg,Partner Name\n')
+
+
+@pytest.fixture(params=['pyarrow', 'c'])
+def csv_engine(request, monkeypatch):
+    if request.param == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(ingestion, 'CSV_ENGINE', request.param)
+    return request.param
+
+
+def write_sheet(tmp_path, name, rows):
+    path = tmp_path / name
+    path.write_text(HEADER + ''.join(row + '\n' for row in rows))
+    return str(path)
+
+
+def test_blank_numeric_cells_read_as_zero(tmp_path, csv_engine):
+    path = write_sheet(tmp_path, 'blank.csv', [
+        'Mugs,M1,White,DTG,1,No,5,3,0.3,A',
+        'Mugs,M1,White,DTG,10,No,,3,0.3,A',
+        'Mugs,M1,White,DTG,,No,7,,,A',
+    ])
+    df = read_supplier_sheet(path)
+    assert df['Quantity'].tolist() == [1, 10, 0]
+    assert df['Printer Cost'].tolist() == [5.0, 0.0, 7.0]
+    assert df['Lead Time'].tolist() == [3.0, 3.0, 0.0]
+    assert df['Weight in kg'].tolist() == [0.3, 0.3, 0.0]
+
+    bids_df, errors = load_bids([path])
+    assert errors == []
+    assert len(bids_df) == 3
+
+
+def test_text_in_numeric_column_is_coerced(tmp_path, csv_engine):
+    path = write_sheet(tmp_path, 'text.csv', [
+        'Mugs,007,White,DTG,1,No,n/a,3,0.3,A',
+        'Mugs,007,White,DTG,10,No,call us,3,0.3,A',
+    ])
+    df = read_supplier_sheet(path)
+    assert df['Printer Cost'].tolist() == [0.0, 0.0]
+    # Text columns are never parsed as numbers
+    assert df['Dandpo SKU'].tolist() == ['007', '007']
+
+
+@pytest.mark.parametrize('quantity', [2.5, 3000000000])
+def test_quantity_is_never_truncated(tmp_path, csv_engine, quantity):
+    path = write_sheet(tmp_path, 'quantity.csv', [
+        'Mugs,M1,White,DTG,2,No,12,3,0.3,A',
+        f'Mugs,M1,White,DTG,{quantity},No,9,3,0.3,B',
+    ])
+    bids_df, errors = load_bids([path])
+    assert errors == []
+    # The odd quantity stays its own product instead of merging with the real 2
+    assert sorted(bids_df['Quantity'].tolist()) == [2, quantity]
+
+
+def test_whole_numbers_export_as_integers(tmp_path, csv_engine):
+    path = write_sheet(tmp_path, 'export.csv', [
+        'Mugs,M1,White,DTG,1,No,5,24,0.3,A',
+        'Mugs,M1,White,DTG,10,No,40,48,2.5,A',
+    ])
+    lines = to_csv_bytes(read_supplier_sheet(path)).decode('utf-8').splitlines()
+    assert lines[1] == 'Mugs,M1,White,DTG,1,No,5,24,0.3,A'
+    assert lines[2] == 'Mugs,M1,White,DTG,10,No,40,48,2.5,A'
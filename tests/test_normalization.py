@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from normalization import Normalizer, StubClient
+
+VALUES = [f'Spec {i:03d}' for i in range(250)]
+
+
+class SlowClient(StubClient):
+    """Holds each request briefly and records the most requests in flight at once."""
+
+    def __init__(self, answers=None, fail_on=()):
+        super().__init__(answers)
+        self.fail_on = set(fail_on)
+        self.in_flight = self.max_in_flight = 0
+        self._flight_lock = threading.Lock()
+
+    def normalize(self, field, values, known):
+        with self._flight_lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.05)
+            if self.fail_on.intersection(values):
+                raise RuntimeError('model unavailable')
+            return super().normalize(field, values, known)
+        finally:
+            with self._flight_lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'normalization.sqlite')
+
+
+def test_batches_respect_size_and_concurrency(db):
+    client = SlowClient()
+    normalizer = Normalizer(client, batch_size=100, concurrency=2, path=db)
+    mapping = normalizer.mapping('Printer Specifications', VALUES)
+
+    assert mapping == {value: value for value in VALUES}
+    assert sorted(len(batch) for batch in client.batches) == [50, 100, 100]
+    assert client.max_in_flight == 2
+    assert normalizer.stats == {'distinct': 250, 'cached': 0, 'requested': 250, 'requests': 3, 'failed': 0}
+
+
+def test_spelling_variants_share_one_request(db):
+    client = StubClient({'DTG Print': 'DTG'})
+    normalizer = Normalizer(client, path=db)
+    mapping = normalizer.mapping('Printer Specifications', ['DTG Print', 'dtg  print', 'DTG'])
+
+    assert set(mapping.values()) == {'DTG'}
+    assert normalizer.stats['requested'] == 2  # 'DTG' and one representative of the folded group
+
+
+def test_repeat_round_makes_no_requests(db):
+    frame = pd.DataFrame({'Combinations': pd.Categorical(['Red,  L', 'Red, L', 'Blue, M'])})
+    first = Normalizer(StubClient({'Red,  L': 'Red, L'}), path=db)
+    expected = first.normalize_frames([frame])[0]
+
+    client = StubClient()
+    second = Normalizer(client, path=db)
+    result = second.normalize_frames([frame])[0]
+
+    assert client.batches == []
+    assert second.stats['requests'] == 0
+    assert second.stats['cached'] == second.stats['distinct'] == 3
+    pd.testing.assert_frame_equal(result, expected)
+    assert result['Combinations'].tolist() == ['Red, L', 'Red, L', 'Blue, M']
+    assert second.signature(frame) == first.signature(frame)
+
+
+def test_failed_batch_leaves_values_unchanged(db):
+    client = SlowClient(answers={value: value.upper() for value in VALUES}, fail_on={'Spec 120'})
+    normalizer = Normalizer(client, batch_size=100, concurrency=3, path=db)
+    mapping = normalizer.mapping('Combinations', VALUES)
+
+    failed = VALUES[100:200]
+    assert all(mapping[value] == value for value in failed)
+    assert all(mapping[value] == value.upper() for value in VALUES[:100] + VALUES[200:])
+    assert normalizer.stats['failed'] == 100
+
+    # Failed values are not stored, so the next round asks for them again
+    retry = StubClient()
+    again = Normalizer(retry, path=db)
+    again.mapping('Combinations', VALUES)
+    assert sorted(value for batch in retry.batches for value in batch) == failed
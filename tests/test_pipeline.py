@@ -0,0 +1,113 @@
+import os
+
+import pandas as pd
+import pytest
+
+import partitioned
+import pipeline
+import storage
+from bidding_core import KEY_COLUMNS, to_wide
+from ingestion import concat_frames, load_supplier_files
+from partitioned import aggregate_sharded, load_bids_out_of_core, partition_count
+from pipeline import load_bids, rank_bids, update_bids
+from synthetic_data import generate_supplier_sheets
+
+
+@pytest.fixture
+def sheets():
+    return generate_supplier_sheets(n_skus=60, n_partners=6, sparsity=0.4, seed=7)
+
+
+def write_sheets(directory, sheets):
+    directory.mkdir(exist_ok=True)
+    paths = []
+    for name, df in sheets:
+        path = directory / name
+        df.to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def assert_same_sheet(actual, expected):
+    pd.testing.assert_frame_equal(to_wide(rank_bids(actual)), to_wide(rank_bids(expected)))
+    assert actual.attrs == expected.attrs
+
+
+@pytest.fixture
+def patched(monkeypatch):
+    """Counts the rounds update_bids patches instead of aggregating in full."""
+    calls = []
+
+    def patch_round(*args):
+        calls.append(args)
+        return patch(*args)
+
+    patch = pipeline._patch_round
+    monkeypatch.setattr(pipeline, '_patch_round', patch_round)
+    return calls
+
+
+def changed(sheet):
+    name, df = sheet
+    df = df.iloc[5:].copy()
+    df.loc[df.index[:10], 'Printer Cost'] *= 0.8
+    extra = df.head(3).assign(**{'Dandpo SKU': 'NEW1'})
+    return name, pd.concat([df, extra], ignore_index=True)
+
+
+@pytest.mark.parametrize('edit', ['changed', 'added', 'removed'])
+def test_update_matches_full_aggregation(tmp_path, sheets, patched, edit):
+    previous = update_bids(write_sheets(tmp_path / 'before', sheets), workers=1)
+
+    if edit == 'changed':
+        sheets = sheets[:2] + [changed(sheets[2])] + sheets[3:]
+    elif edit == 'added':
+        name, df = changed(sheets[0])
+        sheets = sheets + [('newcomer.csv', df.assign(**{'Partner Name': 'Newcomer'}))]
+    else:
+        sheets = sheets[:3] + sheets[4:]
+    paths = write_sheets(tmp_path / 'after', sheets)
+
+    round_ = update_bids(paths, previous, workers=1)
+    full, errors = load_bids(paths, workers=1)
+    assert len(patched) == 1
+    assert round_['errors'] == errors == []
+    assert_same_sheet(round_['bids'], full)
+
+
+def by_key(bids_df):
+    return to_wide(bids_df).sort_values(KEY_COLUMNS, ignore_index=True)
+
+
+def test_out_of_core_matches_in_memory(tmp_path, sheets, monkeypatch):
+    monkeypatch.setattr(storage, 'DATA_DIR', str(tmp_path / 'data'))
+    paths = write_sheets(tmp_path / 'sheets', sheets)
+    memory_mb = 0.05
+    assert partition_count(sum(os.path.getsize(path) for path in paths), memory_mb) >= 2
+
+    bids_df, errors = load_bids_out_of_core(paths, memory_mb)
+    full, full_errors = load_bids(paths, workers=1)
+    assert errors == full_errors == []
+    pd.testing.assert_frame_equal(by_key(bids_df), by_key(full))
+    assert bids_df.attrs == full.attrs
+
+
+@pytest.fixture
+def worker_pools():
+    yield partitioned._pools
+    for pool in partitioned._pools.values():
+        pool.shutdown()
+    partitioned._pools.clear()
+
+
+def test_sharded_matches_serial(tmp_path, sheets, worker_pools):
+    frames, _ = load_supplier_files(write_sheets(tmp_path / 'sheets', sheets))
+    combined_df = concat_frames([df for _, df in frames])
+
+    serial = aggregate_sharded(combined_df.copy(), workers=1)
+    sharded = aggregate_sharded(combined_df.copy(), workers=2, min_rows=0)
+    # The shards ran in the pool rather than falling back to this process
+    assert 2 in worker_pools
+    pd.testing.assert_frame_equal(to_wide(sharded), to_wide(serial))
+    assert sharded.dtypes.astype(str).tolist() == serial.dtypes.astype(str).tolist()
+    assert sharded.attrs == serial.attrs
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from bidding_core import KEY_COLUMNS, PARTNER_COLUMNS_ATTR
+from price_history import PREVIOUS_PRICE_COLUMN, PREVIOUS_ROUND_COLUMN, list_rounds, previous_best, record_round
+
+
+def bidding_sheet(prices: dict[str, float]) -> pd.DataFrame:
+    """One product key per SKU, won by partner A at the given price."""
+    skus = list(prices)
+    df = pd.DataFrame({col: [''] * len(skus) for col in KEY_COLUMNS})
+    df['Dandpo SKU'] = skus
+    df['Quantity'] = 10
+    df['Bid Selected Partners'] = 'A'
+    df['Bid Selected Price'] = [prices[sku] for sku in skus]
+    df['A'] = df['Bid Selected Price']
+    df.attrs[PARTNER_COLUMNS_ATTR] = ['A']
+    return df
+
+
+def test_every_round_is_kept(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    record_round(bidding_sheet({'S1': 100.0, 'S2': 200.0}), 'monday', '2026-01-05', path)
+    # Two tenders on the same day are two rounds
+    record_round(bidding_sheet({'S1': 90.0}), 'tuesday-mugs', '2026-01-06', path)
+    record_round(bidding_sheet({'S2': 180.0}), 'tuesday-caps', '2026-01-06', path)
+
+    assert list_rounds(path)['upload_key'].tolist() == ['monday', 'tuesday-mugs', 'tuesday-caps']
+
+    # A recorded round compares with the rounds recorded before it, the same day included
+    history = previous_best(bidding_sheet({'S1': 95.0, 'S2': 180.0}), 'tuesday-caps', '2026-01-06', path)
+    assert history[PREVIOUS_PRICE_COLUMN].tolist() == [90.0, 200.0]
+    assert history[PREVIOUS_ROUND_COLUMN].tolist() == ['2026-01-06', '2026-01-05']
+
+    history = previous_best(bidding_sheet({'S1': 95.0}), 'tuesday-mugs', '2026-01-06', path)
+    assert history[PREVIOUS_PRICE_COLUMN].tolist() == [100.0]
+
+    # A new set compares with everything recorded up to its date
+    history = previous_best(bidding_sheet({'S1': 80.0, 'S2': 170.0}), 'wednesday', '2026-01-07', path)
+    assert history[PREVIOUS_PRICE_COLUMN].tolist() == [90.0, 180.0]
+
+
+def test_first_round_has_no_previous_prices(tmp_path):
+    history = previous_best(bidding_sheet({'S1': 100.0}), 'monday', '2026-01-05', str(tmp_path / 'history.sqlite'))
+    assert history[PREVIOUS_PRICE_COLUMN].isna().all()
+    assert history[PREVIOUS_ROUND_COLUMN].isna().all()
+
+
+def test_recording_the_same_uploads_replaces_their_round(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    first = record_round(bidding_sheet({'S1': 100.0}), 'monday', '2026-01-05', path)
+    record_round(bidding_sheet({'S1': 120.0}), 'tuesday', '2026-01-06', path)
+    # Re-run on Wednesday: same round id and date, new prices
+    assert record_round(bidding_sheet({'S1': 105.0}), 'monday', '2026-01-07', path) == first
+    assert len(list_rounds(path)) == 2
+
+    history = previous_best(bidding_sheet({'S1': 120.0}), 'tuesday', '2026-01-06', path)
+    assert history[PREVIOUS_PRICE_COLUMN].tolist() == [105.0]